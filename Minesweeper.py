@@ -6,11 +6,11 @@
 # --------------------------------------------------------------------------- #
 #                                                                             #
 #       This is a simple game of Minesweeper done with the Pythons            #
-#       built-in GUI tkinter. It uses "settings.txt" as a tool to             #
+#       built-in GUI tkinter. It uses "settings.json" as a tool to            #
 #       configure between different options available. The game is            #
 #       inspired by the original Microsoft's Minesweeper.                     #
 #                                                                             #
-#       Any modification done to the "settings.txt" file outside the          #
+#       Any modification done to the "settings.json" file outside the         #
 #       software may end up causing an error. Software deals with any         #
 #       of those errors accordingly.                                          #
 #                                                                             #
@@ -23,9 +23,70 @@
 #                                                                             #
 ###############################################################################
 
+import time
+
+# When the program started loading, reported by --profile-startup
+STARTED = time.perf_counter()
+
 from tkinter import *
-import tkinter.messagebox as tm
-import random
+import argparse
+import atexit
+import json
+import os
+import queue
+import threading
+
+import instrument
+import recording
+import simulate
+
+from atomicfile import write_atomic
+from engine import Board
+
+
+# File where the selected settings are saved
+SETTINGS_FILE = "settings.json"
+
+# Settings file of the older versions, read once if found
+LEGACY_SETTINGS_FILE = "settings.txt"
+
+# Seconds to wait for more changes before writing the settings file
+SAVE_DELAY = 0.5
+
+# Boards with more tiles than this are always drawn on a canvas
+BUTTON_GRID_LIMIT = 2500
+
+# Largest board the mine probabilities are shown on
+PROBABILITY_LIMIT = 10000
+
+# Every finished game is recorded into this file.
+LAST_RECORDING_FILE = "last_game.rec"
+
+# Database of the finished games
+STATS_FILE = "stats.db"
+
+# Timings are written here on exit when the instrumentation is on.
+INSTRUMENT_FILE = "timings.json"
+
+# Game captured with cProfile from the debug menu
+GAME_PROFILE_FILE = "game.prof"
+
+# Milliseconds the window may take to show up, see --profile-startup
+STARTUP_TARGET = 500
+
+# Ready no guessing boards are kept in this file between the sessions.
+BOARD_POOL_FILE = "boards.json"
+
+# Largest board played without guessing, bigger boards take too long
+# to check.
+NO_GUESS_LIMIT = 10000
+
+# Boards tried in the background when the pool has none ready
+NO_GUESS_ATTEMPTS = 1000
+
+# Boards with more tiles than this place their mines on a worker
+# thread after the first press.
+BACKGROUND_LIMIT = 10000
 
 
 class GameData:
@@ -37,11 +98,16 @@ class GameData:
         # The first option_0 is the default.
         self.__settings = {"mode": ["beginner",
                                     "normal",
-                                    "advanced"],
+                                    "advanced",
+                                    "custom"],
                            "time": ["yes",
                                     "no"],
                            "flags": ["yes",
-                                     "no"]}
+                                     "no"],
+                           "canvas": ["no",
+                                      "yes"],
+                           "no guessing": ["no",
+                                           "yes"]}
 
         # To add new difficulties need to update this data structure and
         # specify the amount of mines and the grids [y,x] coordinates.
@@ -49,6 +115,13 @@ class GameData:
                        "normal": {"mines": 40, "grid": [16, 16]},
                        "advanced": {"mines": 99, "grid": [16, 30]}}
 
+        # The "custom" mode is chosen by the player within these
+        # [min, max] limits. At least one tile must be free of mines.
+        self.__custom_limits = {"height": [2, 1000],
+                                "width": [2, 1000],
+                                "mines": [1, None]}
+        self.__custom_default = {"height": 30, "width": 40, "mines": 200}
+
     def get_default(self):
         """Returns simple information package about settings attribute"""
 
@@ -73,8 +146,27 @@ class GameData:
 
     def get_mode(self, key):
         """Returns information about mode"""
+
+        if key == "custom":
+            custom = read_custom()
+            return {"mines": custom["mines"],
+                    "grid": [custom["height"], custom["width"]]}
+
         return self.__mode[key]
 
+    def get_custom_default(self):
+        """Returns the default custom board size"""
+        return dict(self.__custom_default)
+
+    def get_custom_limits(self, height, width):
+        """Returns the [min, max] limits of the custom board values.
+           The mine limit depends on the board size."""
+
+        limits = {key: list(value)
+                  for key, value in self.__custom_limits.items()}
+        limits["mines"][1] = height * width - 1
+        return limits
+
 
 class MainWindow:
     """Main window for software. From here we can start different core
@@ -86,9 +178,14 @@ class MainWindow:
 
         self.menus()
 
-        # Game will always be on the screen.
+        # Game will always be on the screen. The board is built on the
+        # first idle tick so the window is shown before it.
         self.g = Game(self.__root)
-        self.g.start()
+        self.__root.after_idle(self.g.start)
+
+        # Milliseconds since STARTED, measured with --profile-startup
+        self.__first_frame = None
+        self.__board_ready = None
 
     def menus(self):
         """Creates the menu bar and adds all
@@ -99,6 +196,21 @@ class MainWindow:
                          tearoff=0)
         file_menu.add_command(label="New Game",
                               command=self.new_game)
+        file_menu.add_command(label="Hint",
+                              command=self.hint)
+
+        self.__probabilities = BooleanVar(value=False)
+        file_menu.add_checkbutton(label="Show Probabilities",
+                                  variable=self.__probabilities,
+                                  command=self.show_probabilities)
+        file_menu.add_command(label="Statistics",
+                              command=self.stats_window)
+        file_menu.add_command(label="Replay Last Game",
+                              command=self.replay_last)
+        file_menu.add_command(label="Open Recording...",
+                              command=self.open_recording)
+        file_menu.add_command(label="Save Recording...",
+                              command=self.save_recording)
         file_menu.add_command(label="Settings",
                               command=self.options_window)
         file_menu.add_command(label="Help",
@@ -118,6 +230,22 @@ class MainWindow:
         self.__menu.add_cascade(label="About",
                                 menu=about_menu)
 
+        # Only there when the instrumentation is on.
+        if instrument.is_enabled():
+            debug_menu = Menu(master=self.__menu,
+                              tearoff=0)
+            debug_menu.add_command(label="Show Timings",
+                                   command=self.timings_window)
+            debug_menu.add_command(label="Dump Timings",
+                                   command=self.dump_timings)
+            debug_menu.add_command(label="Reset Timings",
+                                   command=instrument.reset)
+            debug_menu.add_command(label="Profile Next Game",
+                                   command=instrument.request_profile)
+
+            self.__menu.add_cascade(label="Debug",
+                                    menu=debug_menu)
+
         self.__root.config(menu=self.__menu)
 
         self.__box = Frame()
@@ -147,35 +275,111 @@ class MainWindow:
 
             file.close()
         except FileNotFoundError:
-            tm.showerror(title="ERROR",detail="File not found")
+            messagebox().showerror(title="ERROR",detail="File not found")
 
     def help_window(self):
         """Tips to help player to complete the game"""
 
-        tm.showinfo(title="Help",
-                    detail="How to play:\n\n"
-                           "Step 1.\n"
-                           "Click a square, if you get a number. "
-                           "That number is the number of how many "
-                           "mines are surrounding it.\n\n"
-                           "Step 2.\n"
-                           "Mark all the mines that are downright obvious. "
-                           "Such as eight 1's "
-                           "surrounding an unopened square."
-                           " Remember to use flag mode for those.\n\n"
-                           "Step 3.\n"
-                           "Don't be afraid to fail and start again. "
-                           "It requires multiple tries.",
-                    icon="question")
+        messagebox().showinfo(
+            title="Help",
+            detail="How to play:\n\n"
+                   "Step 1.\n"
+                   "Click a square, if you get a number. "
+                   "That number is the number of how many "
+                   "mines are surrounding it.\n\n"
+                   "Step 2.\n"
+                   "Mark all the mines that are downright obvious. "
+                   "Such as eight 1's "
+                   "surrounding an unopened square."
+                   " Right click flags them, pressing a number "
+                   "with all its mines flagged opens the rest "
+                   "around it.\n\n"
+                   "Step 3.\n"
+                   "Don't be afraid to fail and start again. "
+                   "It requires multiple tries.",
+            icon="question")
 
     def options_window(self):
-        options = Options(self.__root)
+        options = Options(self.__root, on_save=self.g.settings_saved)
         options.start()
 
     def new_game(self):
         # Game can only be restarted.
         self.g.restart()
 
+    def hint(self):
+        self.g.hint()
+
+    def show_probabilities(self):
+        self.g.show_probabilities(self.__probabilities.get())
+
+    def stats_window(self):
+        """Opens the statistics of the current difficulty"""
+
+        StatsWindow(self.__root, get_stats_store(), read_settings()["mode"])
+
+    def timings_window(self):
+        """Shows the recorded timings and counters"""
+
+        TimingsWindow(self.__root)
+
+    def dump_timings(self):
+        """Writes the timings into INSTRUMENT_FILE"""
+
+        try:
+            instrument.dump(INSTRUMENT_FILE)
+        except OSError as error:
+            messagebox().showerror(title="ERROR", detail=str(error))
+
+    def replay_last(self):
+        """Replays the last finished game"""
+
+        # The game that just ended may still be on its way to the disk.
+        get_recording_writer().flush()
+        self.replay_window(LAST_RECORDING_FILE)
+
+    def open_recording(self):
+        """Asks for a recording file and replays it"""
+
+        from tkinter import filedialog
+
+        path = filedialog.askopenfilename(
+            parent=self.__root, title="Open Recording",
+            filetypes=[("Recordings", "*.rec"), ("All files", "*")])
+        if path:
+            self.replay_window(path)
+
+    def save_recording(self):
+        """Saves the recording of the current game into a chosen file"""
+
+        from tkinter import filedialog
+
+        path = filedialog.asksaveasfilename(
+            parent=self.__root, title="Save Recording",
+            defaultextension=".rec",
+            filetypes=[("Recordings", "*.rec"), ("All files", "*")])
+        if not path:
+            return
+
+        try:
+            self.g.get_recording().save(path)
+        except OSError as error:
+            messagebox().showerror(title="ERROR", detail=str(error))
+
+    def replay_window(self, path):
+        """Opens the replay of the recording in path"""
+
+        try:
+            game = recording.load(path)
+        except FileNotFoundError:
+            messagebox().showerror(title="ERROR", detail="No recording found")
+        except (OSError, ValueError) as error:
+            messagebox().showerror(title="ERROR",
+                                   detail="Can't read the recording: {:s}"
+                                   .format(str(error)))
+        else:
+            ReplayWindow(self.__root, game)
+
     def credits(self):
         """Simple information window about the creator."""
 
@@ -207,32 +411,76 @@ class MainWindow:
                    "https://docs.python.org/3") \
             .pack(padx=5, pady=5)
 
+    def profile_startup(self):
+        """Measures the time until the window is shown and the board is
+           built, then closes the window. See startup_report."""
+
+        self.__root.bind("<Map>", self.startup_frame, add="+")
+
+        # Queued after the board is built on the same idle tick.
+        self.__root.after_idle(self.startup_done)
+
+    def startup_frame(self, event=None):
+        """Called when the window is first shown"""
+
+        if self.__first_frame is None:
+            self.__first_frame = (time.perf_counter() - STARTED) * 1000
+
+    def startup_done(self):
+        """Called once the board has been built"""
+
+        # Draws the board before the time is taken.
+        self.__root.update_idletasks()
+        self.__board_ready = (time.perf_counter() - STARTED) * 1000
+        self.startup_frame()
+        self.__root.destroy()
+
+    def startup_report(self):
+        """
+        Returns the startup times as text.
+
+        :return: report text, True if the first frame was shown within
+                 STARTUP_TARGET"""
+
+        # The window was closed before the board was built.
+        if self.__board_ready is None:
+            return "Startup was not measured", False
+
+        lines = ["First frame: {:.0f} ms".format(self.__first_frame),
+                 "Board ready: {:.0f} ms".format(self.__board_ready),
+                 "Target:      {:d} ms".format(STARTUP_TARGET)]
+
+        return "\n".join(lines), self.__first_frame <= STARTUP_TARGET
+
+    def get_root(self):
+        """Returns the root window"""
+        return self.__root
+
     def start(self):
         self.__root.mainloop()
 
+        # The board searches are stopped as soon as the window is
+        # closed, the pool isn't worth waiting for.
+        if _board_pool is not None:
+            _board_pool.close()
+
 
 class Game(Frame):
-    """The game with the interactive UI"""
+    """The game with the interactive UI. All the game logic is handled by
+       the Board engine, this class only displays its state."""
 
     def __init__(self, parent):
         Frame.__init__(self, master=parent)
         self.__parent = parent
         self.pack()
 
-        # Keeping track of all the
-        # revealed tiles.
-        self.__pressed = []
-
-        # Keeping track of flagged tiles
-        self.__flagged = []
+        # Mine probabilities shown on the hidden tiles, kept over
+        # the new games.
+        self.__probabilities = False
 
     def initialize(self):
         """Sets the game board according to settings"""
 
-        # Resets the two tracking lists.
-        self.__pressed.clear()
-        self.__flagged.clear()
-
         self.__settings = read_settings()
         self.__mode = self.__settings["mode"]
 
@@ -242,7 +490,19 @@ class Game(Frame):
         self.__y = self.__info.get_mode(self.__mode)["grid"][0]
         self.__mines_count = self.__info.get_mode(self.__mode)["mines"]
 
-        self.__data, self.__mines = self.create_board()
+        # Board generation running on a worker thread, the game doesn't
+        # react to the player until it's done.
+        self.__task = None
+
+        self.new_board()
+
+        # Created when the first hint is asked.
+        self.__solver = None
+
+        # Board changes waiting to be drawn and the idle callback
+        # that draws them.
+        self.__changes = None
+        self.__changes_after = None
 
         # String variable that we can modify
         self.__default_text = StringVar()
@@ -256,33 +516,18 @@ class Game(Frame):
 
         self.__text_label.pack(pady=5, padx=5)
 
+        # Game time is measured even when the timer isn't shown.
+        self.__clock = Clock()
+
         # Creates the timer if it's enabled
         if self.__settings["time"] == "yes":
             self.timer()
 
-        self.__grid_frame = Frame(master=self,
-                                  bd=1,
-                                  bg="black")
-        self.__grid_frame.pack(pady=10, padx=10)
-
-        self.__flag = IntVar(value=0)
-
-        total_free_tiles = (self.__x * self.__y) - self.__mines_count
-        # Total number of legal tiles in the game
-        self.__count = total_free_tiles
+        self.create_grid()
+        self.show_start()
 
         if self.__settings["flags"] == "yes":
 
-            # Check button which enables player to flag tiles as potential
-            # mine locations. Disabled by default
-            self.__flag_state = Checkbutton(master=self,
-                                            variable=self.__flag,
-                                            text="Flag Mode",
-                                            state=DISABLED)
-
-            self.__flag_state.pack(side=RIGHT,
-                                   padx=10)
-
             # Gives player information about the remaining flags count
             self.__flag_box = Frame(master=self,
                                     bd=1,
@@ -299,7 +544,83 @@ class Game(Frame):
 
             self.__flag_counter.pack(side=LEFT)
 
-        self.create_grid()
+    def new_board(self):
+        """Creates the board and the recording of a new game. Without
+           guessing the board is taken from the pool or searched for
+           in the background."""
+
+        board = None
+
+        if self.__settings["no guessing"] == "yes" \
+                and self.__y * self.__x <= NO_GUESS_LIMIT:
+            board = get_board_pool().take(self.__y, self.__x,
+                                          self.__mines_count)
+
+            # The first games of a size search their board in the
+            # background. An empty board is shown meanwhile.
+            if board is None:
+                from solver import find_no_guess_board
+
+                height, width, mines = self.__y, self.__x, \
+                    self.__mines_count
+                self.__task = BackgroundTask(
+                    self,
+                    lambda stop: find_no_guess_board(
+                        height, width, mines, attempts=NO_GUESS_ATTEMPTS,
+                        stop=stop),
+                    self.board_found,
+                    lambda error: self.board_found(None))
+
+        self.set_board(board)
+
+    def set_board(self, board):
+        """
+        Sets the board of a new game.
+
+        :param board: (seed, y, x) of a no guessing board or None for
+                      a board with the mines placed on the first press"""
+
+        self.__start = None
+
+        if board is None:
+            self.__board = Board(self.__y, self.__x, self.__mines_count)
+        else:
+            seed, y, x = board
+            self.__board = Board(self.__y, self.__x, self.__mines_count,
+                                 seed=seed)
+            self.__board.generate(y, x)
+            self.__start = (y, x)
+
+        self.__recording = recording.Recording(
+            self.__y, self.__x, self.__mines_count,
+            self.__board.get_seed(), self.__mode, self.__start)
+
+    def board_found(self, board):
+        """Starts the game on the no guessing board found in the
+           background"""
+
+        self.__task = None
+        self.set_board(board)
+        self.__solver = None
+        self.__grid.reset(self.__board)
+
+        self.__default_text.set("Press any tile to start the game.")
+        self.show_start()
+        self.update_probabilities()
+
+    def show_start(self):
+        """Highlights the tile the game has to be started from"""
+
+        if self.__task is not None:
+            self.__default_text.set("Generating a board...")
+
+        elif self.__start is not None:
+            self.__grid.highlight(self.__start[0], self.__start[1])
+            self.__default_text.set("Start from the highlighted tile.")
+
+        elif self.__settings["no guessing"] == "yes":
+            self.__default_text.set("No board without guessing was "
+                                    "found, press any tile to start.")
 
     def game_state(self):
         """
@@ -309,17 +630,19 @@ class Game(Frame):
                     to play.
                  False if player has won."""
 
-        if self.__count == 0:
+        count = self.__board.remaining()
+
+        if count == 0:
             return False
         else:
             # Gives player different encouragement text each time
             # a tile is pressed
-            if self.__count % 3 == 0 and self.__count % 7 == 0:
+            if count % 3 == 0 and count % 7 == 0:
                 self.__default_text.set("You're doing great!")
             else:
-                if self.__count % 3 == 0:
+                if count % 3 == 0:
                     self.__default_text.set("Good thinking!")
-                elif self.__count % 7 == 0:
+                elif count % 7 == 0:
                     self.__default_text.set("Well played")
                 else:
                     self.__default_text.set("Nice!")
@@ -329,264 +652,279 @@ class Game(Frame):
     def timer(self):
         """Creates the timer to be displayed"""
 
-        self.__time = Timer(self)
+        self.__time = Timer(self, self.__clock)
 
+    @instrument.timed("create_grid")
     def create_grid(self):
-        """Creates the interactive game board containing
-           the buttons and numeric labels"""
+        """Creates the interactive game board. Depending on the settings
+           it's either drawn on a single canvas or built from buttons"""
 
-        self.__buttons_matrix = []
-        self.__label_matrix = []
+        # Right click flags the tile when flags are enabled.
+        flag_command = None
+        if self.__settings["flags"] == "yes":
+            flag_command = self.flag_method
 
-        for y in range(self.__y):
-            row = Frame(master=self.__grid_frame)
+        grid = choose_grid(self.__settings, self.__y, self.__x)
+        self.__grid = grid(self, self.__board, self.select_button,
+                           flag_command, self.chord)
 
-            buttons_row = []
-            label_row = []
-            for x in range(self.__x):
-                self.__bg = Frame(master=row, width=5, height=5)
-                self.__bg.pack(pady=0, padx=0, side=LEFT)
+        self.__grid.pack(pady=10, padx=10)
+        self.update_probabilities()
 
-                self.__num = Label(master=self.__bg,
-                                   text="")
+    @instrument.timed("select_button")
+    def select_button(self, y, x):
+        """Method for every button in the grid"""
 
-                if self.__data[y][x] is not 0:
-                    self.__num.config(text=self.__data[y][x])
+        # Finished games and flagged tiles don't react to presses.
+        if self.__task is not None \
+                or self.__board.status() != "playing" \
+                or self.__board.is_flagged(y, x):
+            return
+
+        # Big boards place their mines without freezing the window,
+        # the press is made again once they are ready.
+        if not self.__board.is_generated() \
+                and self.__y * self.__x > BACKGROUND_LIMIT:
+            self.generate(y, x)
+            return
+
+        # Pressing a revealed number opens around it.
+        if self.__board.is_opened(y, x):
+            self.chord(y, x)
+            return
+
+        # The mines of a no guessing board are placed already, only the
+        # start tile is certainly safe to press first.
+        if self.__start is not None and self.__board.opened_count() == 0 \
+                and (y, x) != self.__start:
+            self.show_start()
+            return
+
+        # Only the first time button is pressed the timer will start.
+        if self.__board.opened_count() == 0:
+            if instrument.is_profile_requested():
+                instrument.start_profile()
+
+            self.__clock.start()
+            if self.__settings["time"] == "yes":
+                self.__time.start()
+
+        self.record(recording.REVEAL, y, x)
+        self.queue_changes(self.__board.reveal_changes(y, x))
+
+    def generate(self, y, x):
+        """Places the mines around the pressed tile y,x on a worker
+           thread. The metrics of the board are counted there too so
+           the end of the game doesn't wait for them."""
+
+        board = self.__board
+
+        def generate(stop):
+            board.generate(y, x)
+            board.get_metrics()
+
+        self.__task = BackgroundTask(self, generate,
+                                     lambda result: self.generated(y, x),
+                                     self.generation_failed)
+        self.__default_text.set("Generating a board...")
+
+    def generated(self, y, x):
+        """Makes the first press once the mines have been placed"""
+
+        self.__task = None
+        self.__default_text.set("Press any tile to start the game.")
+        self.select_button(y, x)
 
-                self.b = Button(master=self.__num,
-                                width=2,
-                                height=1,
-                                command=lambda row_i=x, column_i=y:
-                                self.select_button(y=column_i, x=row_i))
+    def generation_failed(self, error):
+        """Starts over with a new board when placing the mines failed,
+           the next press tries again"""
 
-                self.b.pack(fill=BOTH)
-                self.__num.pack()
+        self.__task = None
+        self.set_board(None)
+        self.__solver = None
+        self.__grid.reset(self.__board)
+        self.__default_text.set("The board couldn't be generated ({:s}), "
+                                "press any tile to try again."
+                                .format(str(error) or type(error).__name__))
 
-                label_row.append(self.__num)
-                buttons_row.append(self.b)
+    def cancel_task(self):
+        """Stops waiting for the board being generated"""
 
-            row.pack()
-            self.__label_matrix.append(label_row)
-            self.__buttons_matrix.append(buttons_row)
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
 
-    def create_board(self):
-        """Creates the game board matrix containing info
-           about the bomb locations and number indicators
-           for each tile
-
-           :returns: game board matrix,
-                     bomb locations coordinates in list"""
-
-        mines = self.__mines_count
-
-        # Matrix
-        data = []
-        # Mine locations
-        mine_data = []
-
-        # Creating extra row and column each side to ease
-        # mine placement and avoid index errors later on.
-        for i in range(self.__y + 2):
-
-            row = []
-            for p in range(self.__x + 2):
-                row.append(0)
-
-            data.append(row)
-
-        # Place the bombs into the pseudo-random location
-        while mines > 0:
-            r_y = random.randrange(1, self.__y + 1)
-            r_x = random.randrange(1, self.__x + 1)
-
-            if data[r_y][r_x] != "x":
-                data[r_y].insert(r_x, "x")
-                data[r_y].pop(r_x + 1)
-                mines -= 1
-                mine_data.append([r_y - 1, r_x])
-
-        # add's the numeric indicators around the bombs
-        for y in range(1, len(data) - 1):
-
-            for x in range(1, len(data[y]) - 1):
-
-                bomb_count = 0
-                if data[y][x] != "x":
-                    if data[y + 1][x] == "x":
-                        bomb_count += 1
-                    if data[y + 1][x + 1] == "x":
-                        bomb_count += 1
-                    if data[y + 1][x - 1] == "x":
-                        bomb_count += 1
-                    if data[y][x + 1] == "x":
-                        bomb_count += 1
-                    if data[y][x - 1] == "x":
-                        bomb_count += 1
-                    if data[y - 1][x] == "x":
-                        bomb_count += 1
-                    if data[y - 1][x + 1] == "x":
-                        bomb_count += 1
-                    if data[y - 1][x - 1] == "x":
-                        bomb_count += 1
-
-                    data[y][x] = bomb_count
-
-        # Deletes the extra rows that were added
-        data.pop(len(data) - 1)
-        data.pop(0)
-        for row in data:
-            row.pop(len(row) - 1)
-            row.pop(0)
-
-        return data, mine_data
+    def chord(self, y, x):
+        """Opens the neighbours of a revealed number when the flags
+           around it match the number"""
 
-    def select_button(self, y, x):
-        """Method for every button in the grid"""
+        if self.__task is not None or self.__board.status() != "playing":
+            return
 
-        # Only the first time button is pressed the timer will start
-        # and player can start using flags.
-        if len(self.__pressed) == 0:
-            if self.__flag.get() == 0:
-                if self.__settings["flags"] == "yes":
-                    self.__flag_state.config(state=NORMAL)
-                if self.__settings["time"] == "yes":
-                    self.__time.start()
+        changes = self.__board.chord_changes(y, x)
 
-        if self.__flag.get() == 0:
+        # Chords that do nothing aren't actions of the game.
+        if changes.get_opened() or changes.get_status() != "playing":
+            self.record(recording.CHORD, y, x)
+            self.queue_changes(changes)
 
-            # x meaning the bomb
-            if self.__data[y][x] != "x":
+    def record(self, action, y, x):
+        """Adds the action to the recording of the game"""
 
-                # Reveal an area of adjusted empty tiles.
-                if self.__data[y][x] == 0:
-                    self.reveal(x=x, y=y)
-                    self.__storage.clear()
-                else:
-                    self.__pressed.append([y, x])
-                    self.__buttons_matrix[y][x].destroy()
+        self.__recording.add(action, y, x, self.__clock.get_elapsed())
 
-                    if [y, x] in self.__flagged:
-                        self.__flagged.pop(self.__flagged.index([y, x]))
+    def get_recording(self):
+        """Returns the recording of the current game"""
+        return self.__recording
 
-                        self.__remaining_flags \
-                            .set(self.__mines_count - len(self.__flagged))
+    def save_recording(self):
+        """Queues the finished game to be written into the last game
+           recording"""
 
-                    self.__count -= 1
+        get_recording_writer().save(self.__recording, LAST_RECORDING_FILE)
 
-                    if not self.game_state():
-                        self.win()
-            else:
-                self.defeat()
+    def record_stats(self):
+        """Adds the finished game to the statistics"""
+
+        get_stats_store().record(self.__mode, self.__y, self.__x,
+                                 self.__mines_count,
+                                 self.__board.get_seed(),
+                                 self.__clock.get_elapsed(),
+                                 self.__recording.get_event_count(),
+                                 self.__board.get_metrics(),
+                                 self.__board.status() == "won")
+
+    def queue_changes(self, changes):
+        """Draws the changes once Tk is idle. Presses before that are
+           drawn together."""
+
+        if self.__changes is None:
+            self.__changes = changes
+            self.__changes_after = self.after_idle(self.apply_changes)
         else:
-            self.flag_method(x, y)
+            self.__changes.merge(changes)
+            instrument.count("merged_changes")
 
-    def flag_method(self, x, y):
+    def flag_method(self, y, x):
         """Changes the tile text to indicate ether flagged
            or not flagged."""
 
-        if [y, x] not in self.__flagged:
+        if self.__task is not None or self.__board.status() != "playing":
+            return
 
-            # Restricting the number of flags tobe equal to number of bombs
-            if self.__mines_count - len(self.__flagged) > 0:
-                self.__buttons_matrix[y][x].config(text="f")
-                self.__flagged.append([y, x])
+        if self.__board.toggle_flag(y, x):
+            self.record(recording.FLAG, y, x)
 
-                self.__remaining_flags \
-                    .set(self.__mines_count - len(self.__flagged))
+            self.__grid.set_flag(y, x, self.__board.is_flagged(y, x))
 
-            else:
-                self.__default_text.set("No more Flags left")
+            if not self.__board.is_flagged(y, x):
+                self.game_state()
+                self.update_probabilities()
+
+            self.__remaining_flags.set(self.__board.remaining_flags())
+
+        elif not self.__board.is_flagged(y, x):
+            self.__default_text.set("No more Flags left")
 
+    @instrument.timed("apply_changes")
+    def apply_changes(self):
+        """Draws the pending board changes in a single pass"""
+
+        changes = self.__changes
+        self.cancel_changes()
+
+        if changes is None:
+            return
+
+        if changes.get_status() == "lost":
+            self.defeat()
         else:
-            self.__buttons_matrix[y][x].config(text="")
-            self.__flagged.pop(self.__flagged.index([y, x]))
-
-            self.__remaining_flags \
-                .set(self.__mines_count - len(self.__flagged))
-
-            self.game_state()
-
-    def reveal(self, x, y):
-        """Method that'll execute the empty area
-           filter algorithm"""
-
-        # list of all the tiles to be revealed
-        self.__storage = []
-        self.trigger(x, y)
-
-        # Parsing the duplicates
-        parsed = []
-        for i in self.__storage:
-            if i not in parsed:
-                parsed.append(i)
-
-        for coordinate in parsed:
-            if coordinate not in self.__pressed:
-                self.__buttons_matrix[coordinate[0]][coordinate[1]].destroy()
-                self.__count -= 1
-                # Store the destroyed buttons coordinates
-                # so we don't count it multiple times.
-                self.__pressed.append(coordinate)
-                if coordinate in self.__flagged:
-                    self.__flagged.pop(self.__flagged.index(coordinate))
-
-                    self.__remaining_flags \
-                        .set(self.__mines_count - len(self.__flagged))
-
-        # Clears the storage every time the method is used
-        parsed.clear()
+            self.reveal(changes)
+
+    def reveal(self, changes):
+        """Shows the tiles revealed by the board"""
+
+        opened = changes.get_opened()
+        self.__grid.open(opened)
+        instrument.count("opened_tiles", len(opened))
+
+        if self.__solver is not None:
+            self.__solver.update(opened)
+
+        # Revealed area might have contained flags.
+        if self.__settings["flags"] == "yes" and changes.get_unflagged():
+            self.__remaining_flags.set(changes.get_remaining_flags())
+
         # Small chance that revealed area contains
         # the last remaining buttons.
         if not self.game_state():
             self.win()
+        else:
+            self.update_probabilities()
+
+    def show_probabilities(self, enabled):
+        """Turns the mine probabilities on the hidden tiles on or off"""
+
+        self.__probabilities = enabled
+        self.update_probabilities()
+
+    def update_probabilities(self):
+        """Shows the current mine probabilities if they are enabled"""
+
+        if not self.__probabilities \
+                or self.__board.status() != "playing":
+            self.__grid.show_probabilities(None)
+            return
+
+        if self.__x * self.__y > PROBABILITY_LIMIT:
+            self.__default_text.set("The board is too big for "
+                                    "the probabilities.")
+            self.__grid.show_probabilities(None)
+            return
+
+        if self.__solver is None:
+            from solver import Solver
+            self.__solver = Solver(self.__board)
+
+        self.__grid.show_probabilities(self.__solver.probabilities())
 
-    def trigger(self, x, y):
-        """Main loop for reveal method"""
-
-        # Temporary storage for all the empty tiles
-        self.__temp = []
-        self.search(x, y)
-
-        while len(self.__temp) > 0:
-            for coordinate in self.__temp:
-                # Every empty tile will get run through the
-                # search method.
-                self.search(y=coordinate[0], x=coordinate[1])
-                self.__storage.append(coordinate)
-                self.__temp.pop(self.__temp.index(coordinate))
-
-    def search(self, x, y):
-        """Checks all the adjusting tiles
-           in the 3x3 area around x,y
-
-           If tile is NOT empty:
-                    add's to main storage
-           If tile IS empty:
-                    add's to temp storage"""
-
-        for i in range(y - 1, y + 2):
-            for p in range(x - 1, x + 2):
-                # Checks if the coordinates are inside the matrix
-                # to avoid index errors
-                if self.__x > p > -1 and self.__y > i > -1:
-                    coordinate = [i, p]
-                    if coordinate not in self.__storage:
-
-                        if self.__data[coordinate[0]][coordinate[1]] == 0:
-                            self.__temp.append(coordinate)
-                        else:
-                            self.__storage.append(coordinate)
+    def hint(self):
+        """Highlights a tile that is certainly safe to press"""
+
+        # The solver has to see the presses not drawn yet.
+        self.apply_changes()
+
+        if self.__task is not None or self.__board.status() != "playing":
+            return
+
+        # Nothing to deduce from before the start tile is pressed.
+        if self.__start is not None and self.__board.opened_count() == 0:
+            self.show_start()
+            return
+
+        if self.__solver is None:
+            from solver import Solver
+            self.__solver = Solver(self.__board)
+
+        tile = self.__solver.hint()
+
+        if tile is None:
+            self.__default_text.set("No safe tiles left, time to guess.")
+        else:
+            self.__grid.highlight(tile[0], tile[1])
+            self.__default_text.set("Try the highlighted tile.")
 
     def defeat(self):
         """If the game is lost popup will appear and board will be locked"""
 
         self.lock_mine_buttons()
         self.__default_text.set("Game lost!")
-        self.__time.stop()
-        if self.__settings["flags"] == "yes":
-            self.__flag_state.config(state=DISABLED)
+        self.stop_clock()
+        self.save_recording()
+        self.record_stats()
 
-        if tm.askyesno(title="Defeat", detail="Want to start a new game?"):
+        if messagebox().askyesno(title="Defeat",
+                                 detail="Want to start a new game?"):
             self.restart()
         else:
             self.lock_all_buttons()
@@ -597,192 +935,1146 @@ class Game(Frame):
 
         self.__default_text.set("Game won!")
         self.lock_mine_buttons()
-        self.__time.stop()
-        if self.__settings["flags"] == "yes":
-            self.__flag_state.config(state=DISABLED)
+        self.stop_clock()
+        self.save_recording()
+        self.record_stats()
 
-        if tm.askyesno(title="Victory!", detail="Want to start a new game?"):
+        if messagebox().askyesno(title="Victory!",
+                                 detail="Want to start a new game?"):
             self.restart()
 
+    def stop_clock(self):
+        """Stops the game time and the timer showing it"""
+
+        self.finish_profile()
+        self.__clock.stop()
+        if self.__settings["time"] == "yes":
+            self.__time.stop()
+
+    def finish_profile(self):
+        """Writes the cProfile capture of the game if it's being
+           captured"""
+
+        if instrument.is_profiling():
+            instrument.stop_profile(GAME_PROFILE_FILE)
+
+    def get_elapsed(self):
+        """Returns the game time in milliseconds"""
+        return self.__clock.get_elapsed()
+
     def lock_mine_buttons(self):
         """Disables all the buttons on the mine tiles"""
 
-        for coordinate in self.__mines:
-            column = coordinate[0]
-            row = coordinate[1]
-
-            self.__buttons_matrix[column][row - 1] \
-                .config(state=DISABLED, bg="red")
+        self.__grid.show_probabilities(None)
+        self.__grid.lock_mines(self.__board.get_mines())
 
     def lock_all_buttons(self):
         """Disables all the buttons"""
 
-        for row in self.__buttons_matrix:
-            for buttons in row:
-                buttons.config(state=DISABLED)
+        self.__grid.lock_all()
 
+    @instrument.timed("restart")
     def restart(self):
-        """Clears the board and runs it again"""
+        """Starts a new game. The existing widgets are reused unless the
+           settings have changed, then the board is built again."""
 
-        self.__grid_frame.destroy()
+        # An unfinished game ends the capture too.
+        self.finish_profile()
+
+        if not self.settings_changed():
+            self.reset()
+            return
+
+        self.cancel_task()
+        self.cancel_changes()
+        self.__grid.destroy()
         self.__text_label.destroy()
         if self.__settings["flags"] == "yes":
             self.__flag_box.destroy()
-            self.__flag_state.destroy()
         if self.__settings["time"] == "yes":
             self.__time.destroy()
         self.start()
 
-    def start(self):
-
-        self.initialize()
-
+    def settings_changed(self):
+        """Returns True if the saved settings differ from the ones
+           the game was built with"""
 
-class Timer(Frame):
-    """Creates a simple timer to display and keep track of seconds"""
+        settings = read_settings()
+        mode = self.__info.get_mode(settings["mode"])
 
-    def __init__(self, parent):
+        return settings != self.__settings \
+            or mode["grid"] != [self.__y, self.__x] \
+            or mode["mines"] != self.__mines_count
 
-        Frame.__init__(self, master=parent, bd=1, bg="black")
-        self.pack(side=TOP)
-        # Display of the seconds
-        Label(master=self, text="Time:").pack(side=LEFT)
-        self.__text_var = StringVar()
-        self.__text = Label(master=self,
-                            textvariable=self.__text_var)
-        self.__text.pack(side=LEFT)
+    def settings_saved(self):
+        """Drops the board being generated for the old settings and
+           starts again with the new ones"""
 
-        # Numeral value of the seconds.
-        self.__count = 0
-        self.__text_var.set(self.__count)
+        if self.__task is not None and self.settings_changed():
+            self.restart()
 
-        # If the clock is on or off
-        # Default is off.
-        self.__state = False
+    def cancel_changes(self):
+        """Forgets the changes not drawn yet and their idle callback"""
 
-    def initialize(self):
-        """Starting the loop"""
+        if self.__changes_after is not None:
+            self.after_cancel(self.__changes_after)
 
-        self.__state = True
-        self.tic()
+        self.__changes = None
+        self.__changes_after = None
 
-    def state(self):
-        """Change the state."""
-        if self.__state:
-            self.__state = False
-        else:
-            self.__state = True
+    def reset(self):
+        """Resets the board and the texts without rebuilding the widgets"""
 
-    def tic(self):
-        """Actual loop structure itself"""
+        self.cancel_task()
+        self.cancel_changes()
 
-        if self.__state:
-            self.after(1000, self.count)
+        self.new_board()
+        self.__solver = None
+        self.__grid.reset(self.__board)
 
-    def count(self):
-        """Updates the display and runs tic method"""
+        self.__default_text.set("Press any tile to start the game.")
+        self.show_start()
 
-        if self.__state:
-            self.__count += 1
-            self.__text_var.set(self.__count)
+        if self.__settings["flags"] == "yes":
+            self.__remaining_flags.set(self.__mines_count)
+        self.__clock.reset()
+        if self.__settings["time"] == "yes":
+            self.__time.reset()
 
-        self.tic()
+        self.update_probabilities()
 
     def start(self):
+
         self.initialize()
 
-    def stop(self):
-        self.state()
 
+class ButtonGrid(Frame):
+    """Game board built from a Frame, Label and Button for every tile"""
 
-class Options(Toplevel):
-    """Options menu that saves the wanted settings into
-       settings.txt file"""
+    def __init__(self, parent, board, command, flag_command=None,
+                 chord_command=None):
+        """
+        :param command: called with y and x when a tile is pressed
+        :param flag_command: called with y and x on a right click,
+                             flagging is disabled if not given
+        :param chord_command: called with y and x on a middle click"""
 
-    def __init__(self, parent):
+        Frame.__init__(self, master=parent, bd=1, bg="black")
 
-        Toplevel.__init__(self, master=parent)
-        self.wm_title("Settings")
+        self.__board = board
 
-        window = Frame(self)
-        window.pack(padx=5, pady=5)
+        # Shown mine probabilities {(y, x): probability}
+        self.__probabilities = {}
 
-        # Modifies this dict.
-        self.__settings = read_settings()
+        self.__buttons_matrix = []
+        self.__label_matrix = []
 
-        # All the available settings
-        self.__info = GameData()
+        for y in range(board.get_height()):
+            row = Frame(master=self)
 
-        # Creating LabelFrames to indicate a group of settings
-        self.__group_difficulties = LabelFrame(master=self,
-                                               text="Difficulties",
-                                               padx=20, pady=15)
-        self.__group_difficulties.pack(padx=10, pady=10)
+            buttons_row = []
+            label_row = []
+            for x in range(board.get_width()):
+                bg = Frame(master=row, width=5, height=5)
+                bg.pack(pady=0, padx=0, side=LEFT)
 
-        self.__group_options = LabelFrame(master=self,
-                                          text="Settings",
-                                          padx=20, pady=10)
-        self.__group_options.pack(padx=5, pady=5)
+                # The numbers are set when the tile is revealed.
+                num = Label(master=bg,
+                            text="")
 
-        # Creates the buttons
-        self.radio_buttons()
-        self.check_buttons()
-        self.button_box()
+                b = Button(master=num,
+                           width=2,
+                           height=1,
+                           command=lambda row_i=x, column_i=y:
+                           command(y=column_i, x=row_i))
 
-        # Disables the Main window
-        self.grab_set()
-        # Focuses the Option window
-        self.focus_set()
+                b.pack(fill=BOTH)
+                num.pack()
 
-    def check_buttons(self):
-        """Constructs the check buttons."""
+                # Revealed numbers are pressed through the label.
+                num.bind("<Button-1>",
+                         lambda event, row_i=x, column_i=y:
+                         command(y=column_i, x=row_i))
 
-        check_options = []
-        for var in self.__info.get_keys():
+                if flag_command is not None:
+                    b.bind("<Button-3>",
+                           lambda event, row_i=x, column_i=y:
+                           flag_command(y=column_i, x=row_i))
 
-            # "mode" settings will get handled as radio buttons.
-            if var != "mode":
-                check_options.append(var)
+                if chord_command is not None:
+                    for widget in (b, num):
+                        widget.bind("<Button-2>",
+                                    lambda event, row_i=x, column_i=y:
+                                    chord_command(y=column_i, x=row_i))
 
-        # Check buttons need a variable to work properly so we'll save them
-        # into a list.
-        self.__var_list = []
-        for i in range(len(check_options)):
+                # Original color to restore the locked mine buttons.
+                self.__button_bg = b.cget("bg")
 
-            variable = StringVar()
-            self.__var_list.append(variable)
+                label_row.append(num)
+                buttons_row.append(b)
 
-            # Using lambda function, each time the check button is pressed
-            # it will trigger the configure_check function
-            cb = Checkbutton(self.__group_options,
-                             text=check_options[i].capitalize(),
-                             variable=variable,
-                             onvalue="yes",
-                             offvalue="no",
-                             command=lambda x=check_options[i],i=i:
-                             self.configure_check(text=x,index=i))
+            row.pack()
+            self.__label_matrix.append(label_row)
+            self.__buttons_matrix.append(buttons_row)
 
-            cb.pack(side=TOP, pady=5, anchor="w")
+    def open(self, cells):
+        """Hides the buttons on top of the given tiles and shows
+           the numbers under them"""
 
-            if self.__settings[check_options[i]] == "yes":
-                cb.select()
-            else:
-                cb.deselect()
+        for y, x in cells:
+            value = self.__board.get_value(y, x)
+            if value != 0:
+                self.__label_matrix[y][x].config(text=value)
 
-    def configure_check(self, text,index, event=None):
-        """Saves the selected check buttons on/off value to
-           self.__settings dict"""
+            self.__buttons_matrix[y][x].pack_forget()
 
-        self.__settings[text.lower()] = self.__var_list[index].get()
+    def highlight(self, y, x):
+        """Colors the button of the tile"""
 
-    def radio_buttons(self):
-        """Constructs a list of radio buttons with a int variable
-           that will mark their spot in the radio buttons list"""
+        self.__buttons_matrix[y][x].config(bg="pale green")
 
-        self.var = IntVar()
-        self.__difficulties_list = []
+    def lock_mines(self, mines):
+        """Disables all the buttons on the mine tiles"""
 
-        i = 0
+        for coordinate in mines:
+            self.__buttons_matrix[coordinate[0]][coordinate[1]] \
+                .config(state=DISABLED, bg="red")
+
+    def lock_all(self):
+        """Disables all the remaining buttons"""
+
+        for row in self.__buttons_matrix:
+            for buttons in row:
+                buttons.config(state=DISABLED)
+
+    def show_probabilities(self, probabilities):
+        """Writes the mine probabilities on the hidden buttons and colors
+           them. Only the buttons whose probability changed are touched.
+
+           :param probabilities: dict {(y, x): probability} or None to
+                                 clear them"""
+
+        if probabilities is None:
+            probabilities = {}
+
+        previous = self.__probabilities
+        self.__probabilities = probabilities
+
+        for tile in set(previous) | set(probabilities):
+            probability = probabilities.get(tile)
+            if probability == previous.get(tile):
+                continue
+
+            y, x = tile
+            if self.__board.is_opened(y, x):
+                continue
+
+            button = self.__buttons_matrix[y][x]
+            if probability is None:
+                button.config(bg=self.__button_bg)
+            else:
+                button.config(bg=probability_color(probability))
+
+            if not self.__board.is_flagged(y, x):
+                button.config(text=probability_text(probability))
+
+    def set_flag(self, y, x, flagged):
+        """Changes the tile text to indicate ether flagged
+           or not flagged."""
+
+        if flagged:
+            self.__buttons_matrix[y][x].config(text="f")
+        else:
+            self.__buttons_matrix[y][x].config(
+                text=probability_text(self.__probabilities.get((y, x))))
+
+    def reset(self, board):
+        """Puts the buttons back on top of the new board"""
+
+        self.__board = board
+        self.__probabilities = {}
+
+        for y in range(board.get_height()):
+            for x in range(board.get_width()):
+                self.__label_matrix[y][x].config(text="")
+
+                button = self.__buttons_matrix[y][x]
+                button.config(text="", state=NORMAL, bg=self.__button_bg)
+                if not button.winfo_ismapped():
+                    button.pack(fill=BOTH)
+
+
+class CanvasGrid(Frame):
+    """Game board drawn on a single scrollable canvas. Only the tiles
+       in the visible area and a small margin around it have canvas
+       items, the items are recycled when the view scrolls or zooms.
+       The state of the tiles is read from the board so nothing is
+       stored per tile here. One click handler finds the tile under
+       the mouse."""
+
+    # Default size of the tile in pixels and the zoom limits
+    SIZE = 24
+    MIN_SIZE = 8
+    MAX_SIZE = 48
+
+    # Largest view in pixels before scrolling is needed
+    MAX_WIDTH = 960
+    MAX_HEIGHT = 640
+
+    # Extra tiles drawn around the visible area
+    MARGIN = 2
+
+    # Colors of the number indicators
+    COLORS = {1: "blue", 2: "green", 3: "red", 4: "navy",
+              5: "maroon", 6: "teal", 7: "black", 8: "gray"}
+
+    def __init__(self, parent, board, command, flag_command=None,
+                 chord_command=None):
+        """
+        :param command: called with y and x when a tile is pressed
+        :param flag_command: called with y and x on a right click,
+                             flagging is disabled if not given
+        :param chord_command: called with y and x on a middle click"""
+
+        Frame.__init__(self, master=parent, bd=1, bg="black")
+
+        self.__board = board
+        self.__command = command
+        self.__flag_command = flag_command
+        self.__chord_command = chord_command
+        self.__locked = False
+        self.__size = self.SIZE
+
+        # Shown after the game has ended
+        self.__mines = set()
+
+        # Index of the highlighted tile
+        self.__highlight = None
+
+        # Shown mine probabilities {index: probability}
+        self.__probabilities = {}
+
+        # Tiles with canvas items {index: (rectangle, text)} and
+        # the unused items ready to be recycled.
+        self.__drawn = {}
+        self.__free = []
+
+        # Pending redraw
+        self.__redraw_after = None
+
+        self.__canvas = Canvas(master=self, bd=0, highlightthickness=0,
+                               bg="gray75")
+        self.__scroll_x = Scrollbar(master=self, orient=HORIZONTAL,
+                                    command=self.__canvas.xview)
+        self.__scroll_y = Scrollbar(master=self, orient=VERTICAL,
+                                    command=self.__canvas.yview)
+        self.__canvas.config(xscrollcommand=self.__scrolled_x,
+                             yscrollcommand=self.__scrolled_y)
+
+        self.__canvas.grid(row=0, column=0, sticky="nsew")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.__resize()
+
+        canvas = self.__canvas
+        canvas.bind("<Button-1>", self.click)
+        canvas.bind("<Button-2>", self.click)
+        canvas.bind("<Button-3>", self.click)
+        canvas.bind("<Configure>", self.__schedule)
+        canvas.bind("<MouseWheel>", self.__wheel)
+        canvas.bind("<Shift-MouseWheel>", self.__wheel)
+        canvas.bind("<Control-MouseWheel>", self.__wheel)
+        canvas.bind("<Button-4>", self.__wheel)
+        canvas.bind("<Button-5>", self.__wheel)
+        canvas.bind("<Shift-Button-4>", self.__wheel)
+        canvas.bind("<Shift-Button-5>", self.__wheel)
+        canvas.bind("<Control-Button-4>", self.__wheel)
+        canvas.bind("<Control-Button-5>", self.__wheel)
+        canvas.bind("<Enter>", lambda event: canvas.focus_set())
+        canvas.bind("<plus>", lambda event: self.zoom(4))
+        canvas.bind("<minus>", lambda event: self.zoom(-4))
+
+        self.__schedule()
+
+    def click(self, event):
+        """Maps the pixel coordinates to a tile and presses it. Right
+           button flags the tile, middle button opens around it."""
+
+        if self.__locked:
+            return
+
+        x = int(self.__canvas.canvasx(event.x) // self.__size)
+        y = int(self.__canvas.canvasy(event.y) // self.__size)
+
+        if not (0 <= y < self.__board.get_height()
+                and 0 <= x < self.__board.get_width()):
+            return
+
+        if event.num == 3:
+            command = self.__flag_command
+        elif event.num == 2:
+            command = self.__chord_command
+        else:
+            command = self.__command
+
+        if command is not None:
+            command(y=y, x=x)
+
+    def zoom(self, step):
+        """Changes the tile size keeping the center of the view in place"""
+
+        size = min(max(self.__size + step, self.MIN_SIZE), self.MAX_SIZE)
+        if size == self.__size:
+            return
+
+        canvas = self.__canvas
+        center_x = (canvas.canvasx(0) + canvas.winfo_width() / 2) \
+            / self.__size
+        center_y = (canvas.canvasy(0) + canvas.winfo_height() / 2) \
+            / self.__size
+
+        self.__size = size
+        self.__resize()
+
+        width = self.__board.get_width() * size
+        height = self.__board.get_height() * size
+        canvas.xview_moveto(max(center_x * size
+                                - canvas.winfo_width() / 2, 0) / width)
+        canvas.yview_moveto(max(center_y * size
+                                - canvas.winfo_height() / 2, 0) / height)
+
+        # Every item needs new coordinates.
+        self.__recycle_all()
+        self.__schedule()
+
+    def open(self, cells):
+        """Shows the number indicators of the given tiles"""
+
+        # Large areas are cheaper to draw again than to look up.
+        if len(cells) > len(self.__drawn):
+            self.__schedule()
+            return
+
+        width = self.__board.get_width()
+        for y, x in cells:
+            self.__update(y * width + x)
+
+    def set_flag(self, y, x, flagged):
+        """Changes the tile text to indicate ether flagged
+           or not flagged."""
+
+        self.__update(y * self.__board.get_width() + x)
+
+    def highlight(self, y, x):
+        """Colors the tile"""
+
+        previous = self.__highlight
+        self.__highlight = y * self.__board.get_width() + x
+
+        if previous is not None:
+            self.__update(previous)
+        self.__update(self.__highlight)
+
+    def show_probabilities(self, probabilities):
+        """Colors the hidden tiles by their mine probability
+
+           :param probabilities: dict {(y, x): probability} or None to
+                                 clear them"""
+
+        if not probabilities and not self.__probabilities:
+            return
+
+        width = self.__board.get_width()
+        self.__probabilities = {y * width + x: probability
+                                for (y, x), probability
+                                in (probabilities or {}).items()}
+
+        for index in self.__drawn:
+            self.__update(index)
+
+    def lock_mines(self, mines):
+        """Marks all the mine tiles"""
+
+        width = self.__board.get_width()
+        self.__mines = {y * width + x for y, x in mines}
+        self.__schedule()
+
+    def lock_all(self):
+        """Ignores any further clicks"""
+
+        self.__locked = True
+
+    def reset(self, board):
+        """Covers every tile again for the new board"""
+
+        self.__board = board
+        self.__locked = False
+        self.__mines = set()
+        self.__highlight = None
+        self.__probabilities = {}
+
+        self.__recycle_all()
+        self.__schedule()
+
+    def __resize(self):
+        """Sets the scroll region and the view size for the tile size"""
+
+        width = self.__board.get_width() * self.__size
+        height = self.__board.get_height() * self.__size
+
+        self.__canvas.config(scrollregion=(0, 0, width, height),
+                             width=min(width, self.MAX_WIDTH),
+                             height=min(height, self.MAX_HEIGHT))
+
+    def __scrolled_x(self, first, last):
+        self.__show_scrollbar(self.__scroll_x, first, last, row=1, column=0)
+
+    def __scrolled_y(self, first, last):
+        self.__show_scrollbar(self.__scroll_y, first, last, row=0, column=1)
+
+    def __show_scrollbar(self, scrollbar, first, last, row, column):
+        """Scrollbars are only shown when the whole board doesn't fit"""
+
+        if float(first) <= 0 and float(last) >= 1:
+            scrollbar.grid_forget()
+        else:
+            scrollbar.grid(row=row, column=column, sticky="nsew")
+
+        scrollbar.set(first, last)
+        self.__schedule()
+
+    def __wheel(self, event):
+        """Scrolls with the mouse wheel, zooms with Control held"""
+
+        if event.num == 5 or getattr(event, "delta", 0) < 0:
+            step = 1
+        else:
+            step = -1
+
+        # Bit 0x4 of the state is the Control key, 0x1 is Shift.
+        if event.state & 0x4:
+            self.zoom(-4 * step)
+        elif event.state & 0x1:
+            self.__canvas.xview_scroll(step, "units")
+        else:
+            self.__canvas.yview_scroll(step, "units")
+
+    def __schedule(self, event=None):
+        """Draws the view once Tk is idle, scrolling fires many events"""
+
+        if self.__redraw_after is None:
+            self.__redraw_after = self.after_idle(self.__redraw)
+
+    def __recycle_all(self):
+        """Moves every item to the unused items"""
+
+        for items in self.__drawn.values():
+            self.__canvas.itemconfig(items[0], state=HIDDEN)
+            self.__canvas.itemconfig(items[1], state=HIDDEN)
+            self.__free.append(items)
+
+        self.__drawn = {}
+
+    def __redraw(self):
+        """Gives canvas items to the tiles in view and takes them from
+           the tiles that went out of view"""
+
+        self.__redraw_after = None
+
+        canvas = self.__canvas
+        size = self.__size
+        board = self.__board
+        width = board.get_width()
+
+        left = max(int(canvas.canvasx(0) // size) - self.MARGIN, 0)
+        top = max(int(canvas.canvasy(0) // size) - self.MARGIN, 0)
+        right = min(int(canvas.canvasx(canvas.winfo_width()) // size)
+                    + self.MARGIN + 1, width)
+        bottom = min(int(canvas.canvasy(canvas.winfo_height()) // size)
+                     + self.MARGIN + 1, board.get_height())
+
+        visible = set()
+        for y in range(top, bottom):
+            visible.update(range(y * width + left, y * width + right))
+
+        for index in list(self.__drawn):
+            if index not in visible:
+                items = self.__drawn.pop(index)
+                canvas.itemconfig(items[0], state=HIDDEN)
+                canvas.itemconfig(items[1], state=HIDDEN)
+                self.__free.append(items)
+
+        font = ("TkDefaultFont", max(size * 10 // 24, 5), "bold")
+        for index in visible:
+            if index in self.__drawn:
+                self.__update(index)
+                continue
+
+            if self.__free:
+                items = self.__free.pop()
+            else:
+                items = (canvas.create_rectangle(0, 0, 0, 0,
+                                                 outline="gray50"),
+                         canvas.create_text(0, 0))
+
+            y, x = divmod(index, width)
+            canvas.coords(items[0], x * size, y * size,
+                          (x + 1) * size, (y + 1) * size)
+            canvas.coords(items[1], x * size + size // 2,
+                          y * size + size // 2)
+            canvas.itemconfig(items[0], state=NORMAL)
+            canvas.itemconfig(items[1], state=NORMAL, font=font)
+
+            self.__drawn[index] = items
+            self.__update(index)
+
+    def __update(self, index):
+        """Colors and labels the items of the tile from the board state"""
+
+        items = self.__drawn.get(index)
+        if items is None:
+            return
+
+        board = self.__board
+        y, x = divmod(index, board.get_width())
+        text = ""
+        color = "black"
+
+        if board.is_opened(y, x):
+            fill = "gray75"
+            value = board.get_value(y, x)
+            if value != 0:
+                text = value
+                color = self.COLORS.get(value, "black")
+        else:
+            probability = self.__probabilities.get(index)
+
+            if index in self.__mines:
+                fill = "red"
+            elif index == self.__highlight:
+                fill = "pale green"
+            elif probability is not None:
+                fill = probability_color(probability)
+            else:
+                fill = "gray85"
+
+            if board.is_flagged(y, x):
+                text = "f"
+            else:
+                text = probability_text(probability)
+
+        self.__canvas.itemconfig(items[0], fill=fill)
+        self.__canvas.itemconfig(items[1], text=text, fill=color)
+
+
+class BackgroundTask:
+    """Runs a function on a worker thread. The result comes back to
+       the Tk thread through a queue which is polled with after, so
+       the callback is free to use the widgets."""
+
+    # Milliseconds between the checks of the queue
+    POLL_DELAY = 20
+
+    def __init__(self, widget, function, callback, error_callback):
+        """
+        :param widget: any widget, used for scheduling the checks
+        :param function: called on the worker with a threading.Event
+                         that is set when the task is cancelled
+        :param callback: called on the Tk thread with the result
+        :param error_callback: called on the Tk thread with the
+                               exception if the function raised one"""
+
+        self.__widget = widget
+        self.__callback = callback
+        self.__error_callback = error_callback
+
+        # (result, exception) of the function
+        self.__results = queue.Queue()
+        self.__stop = threading.Event()
+
+        threading.Thread(target=self.__run, args=(function,),
+                         name="board-generator", daemon=True).start()
+
+        self.__after = widget.after(self.POLL_DELAY, self.__poll)
+
+    def cancel(self):
+        """Tells the function to stop and drops its result"""
+
+        self.__stop.set()
+        if self.__after is not None:
+            self.__widget.after_cancel(self.__after)
+            self.__after = None
+
+    def __run(self, function):
+        try:
+            self.__results.put((function(self.__stop), None))
+        except Exception as error:
+            self.__results.put((None, error))
+
+    def __poll(self):
+        """Hands the result to the callback once it's there"""
+
+        try:
+            result, error = self.__results.get_nowait()
+        except queue.Empty:
+            self.__after = self.__widget.after(self.POLL_DELAY,
+                                               self.__poll)
+            return
+
+        self.__after = None
+        if error is not None:
+            self.__error_callback(error)
+        else:
+            self.__callback(result)
+
+
+class Clock:
+    """Measures the game time from the monotonic clock so it doesn't
+       drift with the scheduling of the display updates or jump with
+       the system time."""
+
+    def __init__(self):
+
+        # Monotonic time of the start, None while stopped
+        self.__started = None
+
+        # Time measured before the last start in seconds
+        self.__elapsed = 0.0
+
+    def start(self):
+        """Starts or continues measuring"""
+
+        if self.__started is None:
+            self.__started = time.monotonic()
+
+    def stop(self):
+        """Stops measuring, the elapsed time is kept"""
+
+        if self.__started is not None:
+            self.__elapsed += time.monotonic() - self.__started
+            self.__started = None
+
+    def reset(self):
+        """Stops and sets the elapsed time back to zero"""
+
+        self.__started = None
+        self.__elapsed = 0.0
+
+    def is_running(self):
+        """Returns True while the clock is measuring"""
+        return self.__started is not None
+
+    def get_elapsed(self):
+        """Returns the elapsed time in milliseconds"""
+
+        elapsed = self.__elapsed
+        if self.__started is not None:
+            elapsed += time.monotonic() - self.__started
+
+        return int(elapsed * 1000)
+
+
+class Timer(Frame):
+    """Creates a simple timer to display the seconds of a Clock"""
+
+    def __init__(self, parent, clock):
+
+        Frame.__init__(self, master=parent, bd=1, bg="black")
+        self.pack(side=TOP)
+        # Display of the seconds
+        Label(master=self, text="Time:").pack(side=LEFT)
+        self.__text_var = StringVar()
+        self.__text = Label(master=self,
+                            textvariable=self.__text_var)
+        self.__text.pack(side=LEFT)
+
+        self.__clock = clock
+        self.__text_var.set(0)
+
+        # The only pending after callback, None when stopped
+        self.__after = None
+
+    def start(self):
+        """Starts updating the display"""
+
+        if self.__after is None:
+            self.tic()
+
+    def tic(self):
+        """Shows the whole seconds and sleeps until the next one"""
+
+        elapsed = self.__clock.get_elapsed()
+        self.__text_var.set(elapsed // 1000)
+
+        # Waking up right after the next full second keeps the display
+        # in step with the clock however late the callbacks run.
+        self.__after = self.after(1000 - elapsed % 1000, self.tic)
+
+    def stop(self):
+        """Stops the updates and shows the final time with tenths"""
+
+        self.cancel()
+        self.__text_var.set("{:.1f}".format(
+            self.__clock.get_elapsed() // 100 / 10))
+
+    def reset(self):
+        """Stops the updates and sets the display back to zero"""
+
+        self.cancel()
+        self.__text_var.set(0)
+
+    def cancel(self):
+        """Cancels the pending update"""
+
+        if self.__after is not None:
+            self.after_cancel(self.__after)
+            self.__after = None
+
+    def destroy(self):
+        self.cancel()
+        Frame.destroy(self)
+
+
+class ReplayWindow(Toplevel):
+    """Animates a recorded game at an adjustable speed"""
+
+    # Longest pause between two actions at normal speed in milliseconds,
+    # players sometimes think for a long time.
+    MAX_DELAY = 2000
+
+    def __init__(self, parent, game):
+        Toplevel.__init__(self, parent)
+        self.wm_title("Replay")
+
+        self.__recording = game
+        self.__replay = recording.Replay(game)
+
+        # Pending after callback while playing
+        self.__after = None
+
+        self.__text = StringVar()
+        Label(master=self, textvariable=self.__text).pack(pady=5, padx=5)
+
+        # The replay can't be played by clicking.
+        def ignore(y, x):
+            pass
+
+        grid = choose_grid(read_settings(), game.get_height(),
+                           game.get_width())
+        self.__grid = grid(self, self.__replay.get_board(), ignore)
+        self.__grid.pack(pady=10, padx=10)
+
+        controls = Frame(master=self)
+        controls.pack(pady=5, padx=5)
+
+        self.__play_button = Button(master=controls, text="Play", width=6,
+                                    command=self.toggle)
+        self.__play_button.pack(side=LEFT, padx=2)
+        Button(master=controls, text="Step", width=6,
+               command=self.step).pack(side=LEFT, padx=2)
+        Button(master=controls, text="Restart", width=6,
+               command=self.restart).pack(side=LEFT, padx=2)
+
+        # Multiplier of the recorded speed
+        self.__speed = DoubleVar(value=1.0)
+        Scale(master=controls, label="Speed", orient=HORIZONTAL,
+              from_=0.25, to=8, resolution=0.25,
+              variable=self.__speed).pack(side=LEFT, padx=5)
+
+        self.update_text()
+
+    def update_text(self):
+        """Shows the position of the replay"""
+
+        self.__text.set("Mode: {:s}  Seed: {:d}  Move {:d}/{:d}".format(
+            self.__recording.get_mode() or "-", self.__recording.get_seed(),
+            self.__replay.get_position(),
+            self.__recording.get_event_count()))
+
+    def toggle(self):
+        """Starts or pauses the animation"""
+
+        if self.__after is not None:
+            self.pause()
+        else:
+            if self.__replay.is_finished():
+                self.restart()
+            self.__play_button.config(text="Pause")
+            self.schedule()
+
+    def pause(self):
+        """Stops the animation"""
+
+        if self.__after is not None:
+            self.after_cancel(self.__after)
+            self.__after = None
+        self.__play_button.config(text="Play")
+
+    def schedule(self):
+        """Waits for the recorded time before the next action"""
+
+        delay = self.__replay.get_next_delay()
+        if delay is None:
+            self.pause()
+            return
+
+        delay = min(delay, self.MAX_DELAY) / max(self.__speed.get(), 0.25)
+        self.__after = self.after(int(delay), self.play_next)
+
+    def play_next(self):
+        self.__after = None
+        self.step()
+        self.schedule()
+
+    def step(self):
+        """Applies the next action and draws its changes"""
+
+        event = self.__replay.step()
+        if event is None:
+            return
+
+        action, y, x, changes = event
+        board = self.__replay.get_board()
+
+        if action == recording.FLAG:
+            self.__grid.set_flag(y, x, board.is_flagged(y, x))
+        else:
+            self.__grid.open(changes.get_opened())
+
+        if board.status() != "playing":
+            self.__grid.lock_mines(board.get_mines())
+
+        self.update_text()
+
+    def restart(self):
+        """Goes back to the start of the game"""
+
+        self.pause()
+        self.__grid.reset(self.__replay.seek(0))
+        self.update_text()
+
+    def destroy(self):
+        if self.__after is not None:
+            self.after_cancel(self.__after)
+            self.__after = None
+        Toplevel.destroy(self)
+
+
+class TimingsWindow(Toplevel):
+    """Shows the timings and the counters of the instrumentation"""
+
+    def __init__(self, parent):
+        Toplevel.__init__(self, parent)
+        self.wm_title("Timings")
+
+        self.__report = StringVar()
+        Label(master=self, textvariable=self.__report, font="TkFixedFont",
+              justify=LEFT).pack(padx=10, pady=10, anchor="w")
+
+        buttons = Frame(master=self)
+        buttons.pack(pady=5)
+        Button(master=buttons, text="Refresh", width=10,
+               command=self.update_report).pack(side=LEFT, padx=5)
+        Button(master=buttons, text="Close", width=10,
+               command=self.destroy).pack(side=LEFT, padx=5)
+
+        self.update_report()
+
+    def update_report(self):
+        self.__report.set(instrument.report())
+
+
+class StatsWindow(Toplevel):
+    """Shows the statistics of the played games one mode at a time"""
+
+    # Number of the latest games in the rolling win rates
+    ROLLING = [10, 100]
+
+    def __init__(self, parent, store, mode):
+        Toplevel.__init__(self, parent)
+        self.wm_title("Statistics")
+
+        self.__store = store
+        self.__info = GameData()
+
+        self.__mode = StringVar(value=mode)
+        modes = Frame(master=self)
+        modes.pack(side=LEFT, padx=10, pady=10, anchor="n")
+        for name in self.__info.get_list("mode"):
+            Radiobutton(modes, text=name.capitalize(),
+                        variable=self.__mode, value=name,
+                        command=self.update_stats) \
+                .pack(side=TOP, anchor="w")
+
+        self.__summary = StringVar()
+        Label(master=self, textvariable=self.__summary,
+              justify=LEFT).pack(padx=10, pady=10, anchor="w")
+
+        best = LabelFrame(master=self, text="Best times", padx=5, pady=5)
+        best.pack(padx=10, pady=10, fill=BOTH)
+        self.__best = Listbox(best, width=40, height=10)
+        self.__best.pack(fill=BOTH)
+
+        Button(master=self, text="Close", width=10,
+               command=self.destroy).pack(pady=5)
+
+        self.update_stats()
+
+    def update_stats(self):
+        """Loads the aggregates of the selected mode"""
+
+        import sqlite3
+
+        mode = self.__mode.get()
+
+        # Custom games are only compared with the games of the current
+        # custom size, the other modes have a fixed size.
+        size = None
+        lines = []
+        if mode == "custom":
+            board = self.__info.get_mode(mode)
+            size = (board["grid"][0], board["grid"][1], board["mines"])
+            lines.append("Board: {:d}x{:d}, {:d} mines".format(*size))
+
+        # Includes the games still waiting to be written.
+        self.__store.flush()
+
+        try:
+            summary = self.__store.summary(mode, size)
+            rolling = [self.__store.rolling_win_rate(mode, last, size)
+                       for last in self.ROLLING]
+            best = self.__store.best_times(mode, size=size)
+        except sqlite3.Error as error:
+            self.__summary.set("Statistics not available: {:s}"
+                               .format(str(error)))
+            return
+
+        lines += ["Games played: {:d}".format(summary["games"]),
+                 "Games won: {:d} ({:.1%})".format(summary["wins"],
+                                                   summary["win_rate"])]
+
+        for last, (games, wins) in zip(self.ROLLING, rolling):
+            if games:
+                lines.append("Last {:d} games: {:.1%}"
+                             .format(last, wins / games))
+
+        if summary["mean_time"] is not None:
+            lines.append("Mean winning time: {:.1f} s"
+                         .format(summary["mean_time"] / 1000))
+        if summary["mean_three_bv"] is not None:
+            lines.append("Mean 3BV of the won boards: {:.1f}"
+                         .format(summary["mean_three_bv"]))
+
+        self.__summary.set("\n".join(lines))
+
+        self.__best.delete(0, END)
+        for i, (duration, three_bv, clicks, played_at, seed) \
+                in enumerate(best):
+            # 3BV per second tells how fast the board was solved.
+            speed = (three_bv or 0) / max(duration / 1000, 0.001)
+            self.__best.insert(END, "{:2d}. {:7.1f} s  3BV {:3d}  "
+                                    "{:5.2f} 3BV/s  {:s}"
+                               .format(i + 1, duration / 1000,
+                                       three_bv or 0, speed,
+                                       time.strftime(
+                                           "%Y-%m-%d",
+                                           time.localtime(played_at))))
+
+
+class Options(Toplevel):
+    """Options menu that saves the wanted settings into
+       settings.json file"""
+
+    def __init__(self, parent, on_save=None):
+        """
+        :param on_save: function called after the settings are saved"""
+
+        Toplevel.__init__(self, master=parent)
+        self.wm_title("Settings")
+
+        self.__on_save = on_save
+
+        window = Frame(self)
+        window.pack(padx=5, pady=5)
+
+        # Modifies this dict.
+        self.__settings = read_settings()
+
+        # All the available settings
+        self.__info = GameData()
+
+        # Creating LabelFrames to indicate a group of settings
+        self.__group_difficulties = LabelFrame(master=self,
+                                               text="Difficulties",
+                                               padx=20, pady=15)
+        self.__group_difficulties.pack(padx=10, pady=10)
+
+        self.__group_options = LabelFrame(master=self,
+                                          text="Settings",
+                                          padx=20, pady=10)
+        self.__group_options.pack(padx=5, pady=5)
+
+        # Creates the buttons
+        self.radio_buttons()
+        self.custom_fields()
+        self.check_buttons()
+        self.button_box()
+
+        # Disables the Main window
+        self.grab_set()
+        # Focuses the Option window
+        self.focus_set()
+
+    def check_buttons(self):
+        """Constructs the check buttons."""
+
+        check_options = []
+        for var in self.__info.get_keys():
+
+            # "mode" settings will get handled as radio buttons.
+            if var != "mode":
+                check_options.append(var)
+
+        # Check buttons need a variable to work properly so we'll save them
+        # into a list.
+        self.__var_list = []
+        for i in range(len(check_options)):
+
+            variable = StringVar()
+            self.__var_list.append(variable)
+
+            # Using lambda function, each time the check button is pressed
+            # it will trigger the configure_check function
+            cb = Checkbutton(self.__group_options,
+                             text=check_options[i].capitalize(),
+                             variable=variable,
+                             onvalue="yes",
+                             offvalue="no",
+                             command=lambda x=check_options[i],i=i:
+                             self.configure_check(text=x,index=i))
+
+            cb.pack(side=TOP, pady=5, anchor="w")
+
+            if self.__settings[check_options[i]] == "yes":
+                cb.select()
+            else:
+                cb.deselect()
+
+    def configure_check(self, text,index, event=None):
+        """Saves the selected check buttons on/off value to
+           self.__settings dict"""
+
+        self.__settings[text.lower()] = self.__var_list[index].get()
+
+    def radio_buttons(self):
+        """Constructs a list of radio buttons with a int variable
+           that will mark their spot in the radio buttons list"""
+
+        self.var = IntVar()
+        self.__difficulties_list = []
+
+        i = 0
         for mode in self.__info.get_list("mode"):
 
             rb = Radiobutton(self.__group_difficulties,
@@ -812,6 +2104,34 @@ class Options(Toplevel):
         mode = self.__info.get_list("mode")[self.var.get()]
         self.__settings["mode"] = mode
 
+        # Custom size can only be edited when it's selected.
+        state = NORMAL if mode == "custom" else DISABLED
+        for field in self.__custom_fields:
+            field.config(state=state)
+
+    def custom_fields(self):
+        """Constructs the fields for the custom board size"""
+
+        custom = read_custom()
+        box = Frame(self.__group_difficulties)
+        box.pack(side=TOP, anchor="w", padx=20)
+
+        self.__custom_vars = {}
+        self.__custom_fields = []
+        for row, key in enumerate(("height", "width", "mines")):
+            Label(box, text=key.capitalize() + ":") \
+                .grid(row=row, column=0, sticky="w")
+
+            variable = StringVar(value=str(custom[key]))
+            field = Spinbox(box, from_=1, to=10 ** 6, width=8,
+                            textvariable=variable)
+            field.grid(row=row, column=1, pady=1)
+
+            self.__custom_vars[key] = variable
+            self.__custom_fields.append(field)
+
+        self.configure_radio()
+
     def button_box(self):
         """Constructs a default Save and Cancel buttons and binds them as
            keyboard keys"""
@@ -838,7 +2158,24 @@ class Options(Toplevel):
     def save(self, event=None):
         """Saves the settings attribute into input file"""
 
+        if self.__settings["mode"] == "custom":
+            try:
+                custom = {key: int(variable.get())
+                          for key, variable in self.__custom_vars.items()}
+            except ValueError:
+                custom = None
+
+            if not check_custom(custom):
+                messagebox().showerror(title="Custom board",
+                                       detail=custom_limits_text(custom),
+                                       parent=self)
+                return
+
+            save_custom(custom)
+
         save_file(self.__settings)
+        if self.__on_save is not None:
+            self.__on_save()
         self.close()
 
     def close(self, event=None):
@@ -852,10 +2189,215 @@ class Options(Toplevel):
         self.mainloop()
 
 
+class SettingsCache:
+    """Keeps the settings file in memory. The file is read again only
+       when its modification time changes. Saved changes, such as the
+       ones of save_file, go to the cache right away and are written to
+       the disk after a short delay, so a burst of changes causes a
+       single write."""
+
+    def __init__(self, path):
+        self.__path = path
+        self.__document = None
+        self.__mtime = None
+
+        # Pending delayed write
+        self.__timer = None
+        self.__lock = threading.Lock()
+
+    def get_all(self):
+        """Returns a copy of the settings dict"""
+
+        return dict(self.__load()["settings"])
+
+    def get(self, key):
+        """Returns value of a single setting"""
+
+        return self.__load()["settings"][key]
+
+    def get_section(self, name, default=None):
+        """Returns a copy of the other sections stored in the file,
+           such as the custom board sizes"""
+
+        section = self.__load().get(name)
+        if section is None:
+            return default
+        return json.loads(json.dumps(section))
+
+    def store(self, dict_variable):
+        """Replaces the settings and schedules the write"""
+
+        self.store_section("settings", dict(dict_variable))
+
+    def store_section(self, name, value):
+        """Replaces a whole section and schedules the write"""
+
+        # The other sections are written back as they were. A missing
+        # file has none, and saving isn't an error to tell about.
+        if self.__document is None:
+            if self.__file_mtime() is None:
+                settings = parse_legacy_settings(LEGACY_SETTINGS_FILE)
+                if settings is None:
+                    settings = GameData().get_default()
+                self.__document = {"settings": settings}
+            else:
+                self.__load()
+
+        with self.__lock:
+            self.__document[name] = value
+
+            # Writes after SAVE_DELAY unless a newer change comes in.
+            if self.__timer is not None:
+                self.__timer.cancel()
+
+            self.__timer = threading.Timer(SAVE_DELAY, self.flush,
+                                           args=[os.path.abspath(
+                                               self.__path)])
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def flush(self, path=None):
+        """Writes the pending changes to the disk right away"""
+
+        with self.__lock:
+            if self.__timer is None:
+                return
+
+            self.__timer.cancel()
+            self.__timer = None
+
+            if path is None:
+                path = self.__path
+
+            write_json(path, self.__document)
+            self.__mtime = self.__file_mtime()
+
+    def __load(self):
+        """Returns the document, reading the file if it has changed"""
+
+        # Unsaved changes are newer than the file.
+        if self.__timer is not None:
+            return self.__document
+
+        if self.__document is None or self.__mtime != self.__file_mtime():
+            self.__document = parse_settings(self.__path)
+            self.__mtime = self.__file_mtime()
+
+        return self.__document
+
+    def __file_mtime(self):
+        try:
+            return os.stat(self.__path).st_mtime_ns
+        except OSError:
+            return None
+
+
+settings_cache = SettingsCache(SETTINGS_FILE)
+
+# Pending settings are saved when the program closes.
+atexit.register(settings_cache.flush)
+
+# The statistics, the board pool and the popups are imported by the
+# helpers below when first needed so the window shows up sooner. The
+# solver and the file dialogs are imported by the methods using them.
+_stats_store = None
+_board_pool = None
+_recording_writer = None
+
+
+def get_stats_store():
+    """Returns the statistics database, created on the first call"""
+
+    global _stats_store
+
+    if _stats_store is None:
+        import stats
+        _stats_store = stats.StatsStore(STATS_FILE)
+
+        # Games still in the write queue are saved before closing.
+        atexit.register(_stats_store.close)
+
+    return _stats_store
+
+
+def get_recording_writer():
+    """Returns the writer of the last game recordings, created on the
+       first call"""
+
+    global _recording_writer
+
+    if _recording_writer is None:
+        _recording_writer = recording.Writer()
+
+        # The last game is written before closing.
+        atexit.register(_recording_writer.close)
+
+    return _recording_writer
+
+
+def get_board_pool():
+    """Returns the pool of no guessing boards, created on the first
+       call"""
+
+    global _board_pool
+
+    if _board_pool is None:
+        import pool
+        _board_pool = pool.BoardPool(BOARD_POOL_FILE)
+
+        # Workers are stopped and the ready boards saved when closing.
+        atexit.register(_board_pool.close)
+
+    return _board_pool
+
+
+def messagebox():
+    """Returns the tkinter.messagebox module, imported on the first
+       popup"""
+
+    import tkinter.messagebox
+    return tkinter.messagebox
+
+
+def choose_grid(settings, height, width):
+    """Returns the grid class for the board. Depending on the settings
+       it's either drawn on a single canvas or built from buttons"""
+
+    # Big custom boards would need too many widgets for the buttons.
+    if settings["canvas"] == "yes" or height * width > BUTTON_GRID_LIMIT:
+        return CanvasGrid
+    return ButtonGrid
+
+
+def probability_color(probability):
+    """Returns a color from green for the safe tiles through yellow
+       to red for the certain mines"""
+
+    if probability < 0.5:
+        red = 0x90 + int(0x6f * probability * 2)
+        green = 0xee
+    else:
+        red = 0xff
+        green = 0xee - int(0x6e * (probability - 0.5) * 2)
+
+    return "#{:02x}{:02x}{:02x}".format(red, green, 0x90)
+
+
+def probability_text(probability):
+    """Returns the probability as a percentage that fits a tile, "x"
+       for a certain mine and "" for no probability"""
+
+    if probability is None:
+        return ""
+    if probability >= 1:
+        return "x"
+    return "{:d}".format(min(int(round(probability * 100)), 99))
+
+
 def check_settings(dict_variable):
     """
     Looks for any illegal modifications that might occur
-    in the "settings.txt" file.
+    in the settings file.
 
     :param dict_variable: settings in the dict format.
     :return: True if none were found
@@ -863,101 +2405,329 @@ def check_settings(dict_variable):
 
     info = GameData()
 
-    try:
-        i = 0
-        # Need to be as many settings
-        if len(dict_variable) == len(info.get_default()):
-
-            for settings in dict_variable:
+    if not isinstance(dict_variable, dict):
+        return False
 
-                # Need to found in existing dict/list
-                if settings in info.get_keys():
-                    a = dict_variable[settings]
-                    if a in info.get_list(settings):
-                        i += 1
+    # Need to be exactly the same settings
+    if dict_variable.keys() != info.get_default().keys():
+        return False
 
-            if i == len(dict_variable):
-                return True
-            else:
-                return False
-        else:
+    # Need to found in existing list
+    for settings in dict_variable:
+        if dict_variable[settings] not in info.get_list(settings):
             return False
 
-    except KeyError:
+    return True
+
+
+def complete_settings(dict_variable):
+    """
+    Adds the settings missing from the dict with their default values.
+
+    :return: True if any were added"""
+
+    if not isinstance(dict_variable, dict):
         return False
 
+    added = False
+    for key, value in GameData().get_default().items():
+        if key not in dict_variable:
+            dict_variable[key] = value
+            added = True
+
+    return added
+
 
 def save_file(dict_variable):
-    """Overwrites the settings file"""
+    """Validates and saves the settings. The file is written shortly
+       after, see SettingsCache."""
 
-    with open("settings.txt", "w") as file:
+    if check_settings(dict_variable):
+        settings_cache.store(dict_variable)
 
-        if check_settings(dict_variable):
-            for var in sorted(dict_variable):
-                file.write("{:s}={:s}\n"
-                           .format(var, dict_variable[var]))
+    else:
+        file_error()
+        settings_cache.store(GameData().get_default())
 
-            file.close()
 
-        else:
-            file_error()
-            print("asd")
-            default = GameData().get_default()
-            for var in default:
-                file.write("{:s}={:s}\n"
-                           .format(var, default[var]))
+def check_custom(custom):
+    """
+    Checks that the custom board size is within the limits.
 
-            file.close()
+    :param custom: dict of the height, width and mines.
+    :return: True if acceptable
+             False if not"""
+
+    if not isinstance(custom, dict) \
+            or custom.keys() != {"height", "width", "mines"}:
+        return False
+
+    for value in custom.values():
+        if type(value) is not int:
+            return False
+
+    limits = GameData().get_custom_limits(custom["height"], custom["width"])
+    for key, (low, high) in limits.items():
+        if not low <= custom[key] <= high:
+            return False
+
+    return True
+
+
+def custom_limits_text(custom):
+    """Explains the custom board limits to the player"""
+
+    limits = GameData().get_custom_limits(2, 2)
+    text = "Height and width need to be between {:d} and {:d}.\n" \
+        .format(limits["height"][0], limits["height"][1])
+    text += "There needs to be at least one mine and one free tile"
+
+    if custom is not None:
+        try:
+            text += ", at most {:d} mines on a {:d}x{:d} board" \
+                .format(custom["height"] * custom["width"] - 1,
+                        custom["height"], custom["width"])
+        except (KeyError, TypeError):
+            pass
+
+    return text + "."
+
+
+def read_custom():
+    """Returns the saved custom board size, or the default if there's
+       none or it's not acceptable"""
+
+    custom = settings_cache.get_section("custom")
+    if check_custom(custom):
+        return custom
+
+    return GameData().get_custom_default()
+
+
+def peek_custom(path):
+    """Returns the custom board size saved in the settings file without
+       creating or fixing the file, the default if there's none or
+       it's not acceptable"""
+
+    try:
+        with open(path, "r") as file:
+            custom = json.load(file).get("custom")
+    except (OSError, ValueError, AttributeError):
+        custom = None
+
+    if check_custom(custom):
+        return custom
+
+    return GameData().get_custom_default()
+
+
+def save_custom(custom):
+    """Saves the custom board size, it must be checked beforehand"""
+
+    settings_cache.store_section("custom", dict(custom))
+
+
+def write_json(path, document):
+    """Writes the settings document as JSON. A crash can't leave the
+       settings file half written, see atomicfile."""
+
+    write_atomic(path, json.dumps(document, indent=2, sort_keys=True)
+                 + "\n")
 
 
 def read_settings():
     """
-    Reads the "settings.txt" file where we fetch the settings
-    and save it into dict to use.
+    Returns the settings from the cache. The settings file is
+    only read when it has changed.
 
     :return: dict containing the setting and it's value.
     """
 
-    data = {}
+    return settings_cache.get_all()
+
+
+def parse_settings(path):
+    """
+    Reads the JSON settings file. The "settings" section is validated,
+    other sections are kept as they are. Settings from the old
+    "settings.txt" file are moved over if there's no settings file yet.
+
+    :return: dict of the file sections.
+    """
+
     try:
-        with open("settings.txt", "r") as file:
+        with open(path, "r") as file:
+            document = json.load(file)
 
-            for line in file:
-                if line != "\n":
-                    parts = line.split("=")
-                    data[parts[0]] = parts[1].rstrip()
+        # Settings added in the newer versions get their defaults.
+        added = False
+        if isinstance(document, dict):
+            added = complete_settings(document.get("settings"))
 
         # Checks if the file is acceptable
-        if check_settings(data):
-            return data
-        # Raises the general IndexError in all the other cases
-        else:
-            raise IndexError
+        if not isinstance(document, dict) \
+                or not check_settings(document.get("settings")):
+            raise ValueError
+
+        if added:
+            write_json(path, document)
 
-    except IndexError:
+        return document
+
+    except ValueError:
         # Resets the file and displays the error popup.
-        default = GameData().get_default()
-        save_file(default)
+        document = {"settings": GameData().get_default()}
+        write_json(path, document)
         file_error()
-        return default
+        return document
     except FileNotFoundError:
-        # Creates the new "settings.txt" using default settings.
-        default = GameData().get_default()
-        save_file(default)
+        pass
+
+    # Creates the new settings file using the old "settings.txt" if it's
+    # there, otherwise the default settings.
+    settings = parse_legacy_settings(LEGACY_SETTINGS_FILE)
+    if settings is None:
+        settings = GameData().get_default()
         file_error()
-        return default
+
+    document = {"settings": settings}
+    write_json(path, document)
+    return document
+
+
+def parse_legacy_settings(path):
+    """
+    Reads the old "settings.txt" file which has a setting=value
+    on every line.
+
+    :return: dict containing the setting and it's value,
+             None if the file is missing or not acceptable.
+    """
+
+    data = {}
+    try:
+        with open(path, "r") as file:
+            for line in file:
+                if line != "\n":
+                    parts = line.split("=")
+                    data[parts[0]] = parts[1].rstrip()
+
+    except (IndexError, OSError):
+        return None
+
+    complete_settings(data)
+    if check_settings(data):
+        return data
+
+    return None
 
 
 def file_error():
     """Simple generic popup informing about file reading/writing
        related error"""
 
-    tm.showinfo(title="Error",
-                detail="There was an Error reading the file.\n"
-                       "Restoring default settings.",
-                icon="error")
+    messagebox().showinfo(title="Error",
+                          detail="There was an Error reading the file.\n"
+                                 "Restoring default settings.",
+                          icon="error")
+
+
+def main(argv=None):
+    """Starts the game, or runs the command given on the command line"""
+
+    parser = argparse.ArgumentParser(description="Minesweeper")
+    parser.add_argument("--instrument", action="store_true",
+                        help="record the timings of the hot paths, they "
+                             "are written into {:s} on exit. Also turned "
+                             "on by the {:s} environment variable"
+                             .format(INSTRUMENT_FILE,
+                                     instrument.ENV_VARIABLE))
+    parser.add_argument("--profile-game", action="store_true",
+                        help="capture the first game with cProfile into "
+                             + GAME_PROFILE_FILE)
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time to the first frame and "
+                             "quit, exits with 1 if it's slower than "
+                             "{:d} ms".format(STARTUP_TARGET))
+    commands = parser.add_subparsers(dest="command")
+
+    info = GameData()
+    simulate_parser = commands.add_parser(
+        "simulate", help="play seeded games with the solver and report "
+                         "the win rate")
+    simulate.add_arguments(simulate_parser, info.get_list("mode"))
+
+    replay_parser = commands.add_parser(
+        "replay", help="replay a recorded game")
+    replay_parser.add_argument("file",
+                               help="recording to replay, the last game "
+                                    "is in " + LAST_RECORDING_FILE)
+    replay_parser.add_argument("--position", type=int, metavar="N",
+                               help="print the board after N actions "
+                                    "instead of opening the window")
+
+    args = parser.parse_args(argv)
+
+    if args.instrument:
+        instrument.enable()
+    if instrument.is_enabled():
+        atexit.register(instrument.dump, INSTRUMENT_FILE)
+    if args.profile_game:
+        instrument.request_profile()
+
+    if args.command == "simulate":
+        # The saved custom size fills in the missing values. It's read
+        # without the settings cache which would create or reset the
+        # file and show a popup.
+        if args.mode == "custom":
+            saved = peek_custom(SETTINGS_FILE)
+            mode = {"grid": [saved["height"], saved["width"]],
+                    "mines": saved["mines"]}
+        else:
+            mode = info.get_mode(args.mode)
+
+        custom = {"height": args.height or mode["grid"][0],
+                  "width": args.width or mode["grid"][1],
+                  "mines": args.mines or mode["mines"]}
+
+        if args.mode != "custom" and (args.height or args.width
+                                      or args.mines):
+            parser.error("--height, --width and --mines need --mode custom")
+        if not check_custom(custom):
+            parser.error(custom_limits_text(custom))
+
+        simulate.run(args, custom["height"], custom["width"],
+                     custom["mines"])
+
+    elif args.command == "replay":
+        try:
+            game = recording.load(args.file)
+        except (OSError, ValueError) as error:
+            parser.error("can't read {:s}: {:s}".format(args.file, str(error)))
+
+        if args.position is not None:
+            board = recording.replay(game, args.position)
+            print(recording.format_board(board))
+            print("Move {:d}/{:d}  Status: {:s}".format(
+                min(max(args.position, 0), game.get_event_count()),
+                game.get_event_count(), board.status()))
+        else:
+            ui = MainWindow()
+            ReplayWindow(ui.get_root(), game)
+            ui.start()
+    elif args.profile_startup:
+        ui = MainWindow()
+        ui.profile_startup()
+        ui.start()
+
+        report, fast = ui.startup_report()
+        print(report)
+        if not fast:
+            return 1
+    else:
+        ui = MainWindow()
+        ui.start()
 
 
 if __name__ == '__main__':
-    ui = MainWindow()
-    ui.start()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+Writing files so that a crash can't leave them half written.
+
+The data goes into a temporary file next to the target, is flushed to
+the disk and then renamed over the target in one step. Readers see
+either the old file or the new one, never a mix of them.
+"""
+
+import os
+import tempfile
+
+# The umask can only be read by setting it, which is done once here
+# instead of on every write while other threads may create files.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_atomic(path, data):
+    """
+    Replaces the file in path with the data.
+
+    :param data: bytes, or str which is written as UTF-8"""
+
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(
+        dir=directory, prefix="." + os.path.basename(path) + "-",
+        suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        # The temporary file is only readable by its owner. The result
+        # keeps the mode of the file it replaces, or gets the one a
+        # plain open() would give.
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except OSError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(temporary, mode)
+
+        os.replace(temporary, path)
+
+    except BaseException:
+        os.unlink(temporary)
+        raise
@@ -0,0 +1,58 @@
+"""
+Times the flood fill reveal on square boards of growing size.
+
+Each board gets a low mine density so a single click on an empty tile
+opens most of the board. If the fill is linear the time per revealed
+tile stays flat while the board grows.
+
+Usage: python benchmarks/bench_reveal.py [size ...]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from engine import Board
+
+DEFAULT_SIZES = [100, 250, 500, 1000]
+
+# Share of the tiles that are mines.
+DENSITY = 0.01
+
+
+def bench(size):
+    """Reveals the biggest area we can find from one click.
+
+    :return: number of revealed tiles, seconds taken"""
+
+    board = Board(size, size, int(size * size * DENSITY), seed=size)
+
+    # The first tile is always empty.
+    y, x = size // 2, size // 2
+    board.generate(y, x)
+
+    start = time.perf_counter()
+    opened = board.reveal(y, x)
+    elapsed = time.perf_counter() - start
+
+    return len(opened), elapsed
+
+
+def main(argv):
+    sizes = [int(size) for size in argv] or DEFAULT_SIZES
+
+    print("{:>11s} {:>10s} {:>10s} {:>13s}"
+          .format("board", "revealed", "seconds", "ns per tile"))
+
+    for size in sizes:
+        opened, elapsed = bench(size)
+        print("{:>11s} {:>10d} {:>10.3f} {:>13.0f}"
+              .format("{:d}x{:d}".format(size, size), opened, elapsed,
+                      elapsed / opened * 1e9))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,320 @@
+"""
+Benchmark suite for the hot paths of the game.
+
+Times the board generation, the flood fill reveal, the grid widget
+construction and the New Game restart on sizes from beginner up to
+large custom boards. The rendering benchmarks need an X display. If
+there's none, a virtual one is started with Xvfb when it's installed,
+otherwise they are skipped.
+
+Usage:
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare baseline.json
+
+With --compare the median of every benchmark is checked against the
+saved results and the exit status is 1 if any is slower than the
+threshold allows or missing from this run. The rendering benchmarks
+may only be missing when they were skipped with --no-render.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import engine
+from engine import Board, generate_board
+
+# Name, height, width, mines. The custom boards have a low density so
+# that the reveal benchmark opens most of the board.
+ENGINE_SIZES = [("beginner", 9, 9, 10),
+                ("normal", 16, 16, 40),
+                ("advanced", 16, 30, 99),
+                ("200x200", 200, 200, 400),
+                ("1000x1000", 1000, 1000, 10000)]
+
+# The button grid creates three widgets per tile so it's kept smaller.
+BUTTON_SIZES = ENGINE_SIZES[:3] + [("50x50", 50, 50, 25)]
+CANVAS_SIZES = ENGINE_SIZES[:4]
+
+RESTART_MODES = ["beginner", "normal", "advanced"]
+
+# Prefixes of the benchmarks bench_render adds
+RENDER_PREFIXES = ("create_grid/", "restart/")
+
+
+def measure(function, repeat):
+    """
+    Runs the function repeat times.
+
+    :param function: called with no arguments, may return a second
+                     function to call untimed after each run.
+    :return: dict of the timings in seconds"""
+
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        cleanup = function()
+        times.append(time.perf_counter() - start)
+
+        if callable(cleanup):
+            cleanup()
+
+    return {"median": statistics.median(times),
+            "min": min(times),
+            "runs": repeat}
+
+
+def runs_for(height, width, repeat):
+    """Fewer runs on the big boards to keep the suite quick. The
+       medium boards still get a few so one slow run doesn't decide
+       the median."""
+
+    if height * width >= 10 ** 6:
+        return max(1, repeat // 10)
+    if height * width >= 10 ** 4:
+        return max(min(repeat, 3), repeat // 3)
+    return repeat
+
+
+def bench_engine(results, repeat):
+    """Board generation and the flood fill reveal"""
+
+    # NumPy is imported by the first big board, which isn't part of
+    # the generation time.
+    engine._load_numpy()
+
+    for name, height, width, mines in ENGINE_SIZES:
+        runs = runs_for(height, width, repeat)
+        center = (height // 2, width // 2)
+
+        results["generate/" + name] = measure(
+            lambda: generate_board(height, width, mines, safe=center), runs)
+
+        def reveal():
+            board = Board(height, width, mines, seed=1)
+            board.generate(center[0], center[1])
+
+            start = time.perf_counter()
+            board.reveal(center[0], center[1])
+            return time.perf_counter() - start
+
+        # Only the reveal itself is timed.
+        times = [reveal() for i in range(runs)]
+        results["reveal/" + name] = {"median": statistics.median(times),
+                                     "min": min(times),
+                                     "runs": runs}
+
+
+def start_display():
+    """
+    Makes sure there's an X display for the rendering benchmarks.
+
+    :return: the started Xvfb process, True if a display already
+             exists, None if there's no display"""
+
+    if os.environ.get("DISPLAY"):
+        return True
+
+    if shutil.which("Xvfb") is None:
+        return None
+
+    display = ":{:d}".format(90 + os.getpid() % 10)
+    process = subprocess.Popen(["Xvfb", display, "-screen", "0",
+                                "1920x1080x24"],
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+
+    # Waits for the server to accept connections.
+    import tkinter
+    for i in range(50):
+        try:
+            tkinter.Tk().destroy()
+            return process
+        except tkinter.TclError:
+            time.sleep(0.1)
+
+    process.terminate()
+    return None
+
+
+def bench_render(results, repeat):
+    """Grid construction and New Game restart"""
+
+    import tkinter
+    import Minesweeper
+
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        return False
+
+    def command(y, x):
+        pass
+
+    for grid, sizes in ((Minesweeper.ButtonGrid, BUTTON_SIZES),
+                        (Minesweeper.CanvasGrid, CANVAS_SIZES)):
+        for name, height, width, mines in sizes:
+            board = Board(height, width, mines, seed=1)
+
+            def create():
+                widget = grid(root, board, command)
+                widget.pack()
+                root.update_idletasks()
+                return widget.destroy
+
+            results["create_grid/{:s}/{:s}".format(grid.__name__, name)] = \
+                measure(create, runs_for(height, width, repeat))
+
+    # The game reads the settings from the working directory.
+    previous = os.getcwd()
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+
+    try:
+        # A settings file to start from, so nothing is migrated or
+        # reported missing while the benchmarks run.
+        info = Minesweeper.GameData()
+        Minesweeper.write_json(Minesweeper.SETTINGS_FILE,
+                               {"settings": info.get_default()})
+
+        for canvas in ("no", "yes"):
+            for mode in RESTART_MODES:
+                settings = info.get_default()
+                settings["mode"] = mode
+                settings["canvas"] = canvas
+                Minesweeper.save_file(settings)
+
+                game = Minesweeper.Game(root)
+                game.start()
+                root.update_idletasks()
+
+                def restart():
+                    game.restart()
+                    root.update_idletasks()
+
+                renderer = "CanvasGrid" if canvas == "yes" else "ButtonGrid"
+                results["restart/{:s}/{:s}".format(renderer, mode)] = \
+                    measure(restart, repeat)
+
+                game.destroy()
+    finally:
+        Minesweeper.settings_cache.flush()
+        os.chdir(previous)
+        shutil.rmtree(directory, ignore_errors=True)
+        root.destroy()
+
+    return True
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change of every benchmark against the baseline.
+
+    :return: lists of the benchmark names that got slower than the
+             threshold allows and of the ones in the baseline missing
+             from the results"""
+
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            print("{:45s} {:>10.3f} ms  (new)"
+                  .format(name, results[name]["median"] * 1000))
+            continue
+
+        old = baseline[name]["median"]
+        new = results[name]["median"]
+        change = (new - old) / old if old else 0.0
+
+        mark = ""
+        if change > threshold:
+            regressions.append(name)
+            mark = "  REGRESSION"
+
+        print("{:45s} {:>10.3f} ms  {:+7.1%}{:s}"
+              .format(name, new * 1000, change, mark))
+
+    missing = sorted(name for name in baseline if name not in results)
+    for name in missing:
+        print("{:45s} {:>10s}     (missing)".format(name, "-"))
+
+    return regressions, missing
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per benchmark on the small boards")
+    parser.add_argument("--output", metavar="FILE",
+                        help="save the results as JSON")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare against saved JSON results")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown before a regression, "
+                             "0.2 meaning 20%%")
+    parser.add_argument("--no-render", action="store_true",
+                        help="skip the benchmarks that need a display")
+    args = parser.parse_args(argv)
+
+    results = {}
+    bench_engine(results, args.repeat)
+
+    rendered = False
+    if not args.no_render:
+        display = start_display()
+
+        if display is None:
+            print("No X display or Xvfb available, skipping the rendering "
+                  "benchmarks.", file=sys.stderr)
+        else:
+            try:
+                rendered = bench_render(results, args.repeat)
+            finally:
+                if display is not True:
+                    display.terminate()
+
+    report = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "rendered": rendered,
+              "results": results}
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)["results"]
+
+        regressions, missing = compare(results, baseline, args.threshold)
+
+        if args.no_render:
+            # Skipped on purpose, not lost.
+            missing = [name for name in missing
+                       if not name.startswith(RENDER_PREFIXES)]
+
+        if missing:
+            print("{:d} benchmark(s) of the baseline didn't run."
+                  .format(len(missing)), file=sys.stderr)
+
+        if regressions or missing:
+            return 1
+    elif not args.output:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
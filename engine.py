@@ -0,0 +1,601 @@
+"""
+Headless Minesweeper board engine.
+
+Holds the mine layout, the revealed tiles and the flagged tiles of a
+single game. It does not depend on tkinter so it can be used to run
+games at full speed without any display, the UI in "Minesweeper.py"
+is only a view over it.
+
+Every per tile information is kept in a bytearray indexed by
+y * width + x, so a board takes two bytes per tile.
+"""
+
+import random
+from collections import deque
+
+import instrument
+
+# NumPy is optional, it's only used to speed up the board generation
+# of the big boards. It's imported when the first one is generated
+# since the import takes longer than generating the standard boards.
+numpy = None
+_numpy_loaded = False
+
+# Boards with fewer tiles than this are counted without NumPy, it's
+# not faster on them.
+NUMPY_LIMIT = 2500
+
+# Value of a mine tile in the board data. Other tiles hold the number of
+# surrounding mines 0-8.
+MINE = 9
+
+# Bits of the tile state.
+HIDDEN = 0
+OPENED = 1
+FLAGGED = 2
+
+
+class Board:
+    """Game board containing the mine layout and the state of each tile"""
+
+    def __init__(self, height, width, mines, seed=None):
+        """
+        :param seed: int seed or random.Random instance used for the
+                     mine placement. Random seed is picked if not given
+                     so every game can be replayed with get_seed()."""
+
+        self.__y = height
+        self.__x = width
+        self.__mines_count = mines
+
+        if isinstance(seed, random.Random):
+            self.__seed = None
+            self.__rng = seed
+        else:
+            if seed is None:
+                seed = random.randrange(2 ** 32)
+            self.__seed = seed
+            self.__rng = random.Random(seed)
+
+        # The mines are placed on the first reveal so that
+        # the first tile is never a mine.
+        self.__data = None
+        self.__mines = []
+
+        # Counted from the data when first asked
+        self.__metrics = None
+
+        # State bits of every tile, all start HIDDEN.
+        self.__state = bytearray(self.__y * self.__x)
+
+        # Number of flags placed
+        self.__flags = 0
+
+        # Total number of legal tiles in the game
+        self.__count = (self.__x * self.__y) - self.__mines_count
+
+        # "playing", "won" or "lost"
+        self.__status = "playing"
+
+    @instrument.timed("create_board")
+    def generate(self, y, x):
+        """Places the mines keeping tile y,x safe. Called by the first
+           reveal unless done beforehand. The metrics are only counted
+           when asked so big boards start quickly."""
+
+        self.__data, self.__mines = generate_board(
+            self.__y, self.__x, self.__mines_count, self.__rng, safe=(y, x))
+        self.__metrics = None
+
+    def get_height(self):
+        """Returns the number of rows in the board"""
+        return self.__y
+
+    def get_width(self):
+        """Returns the number of columns in the board"""
+        return self.__x
+
+    def get_seed(self):
+        """Returns the seed of the board or None if it was
+           given as a random.Random instance"""
+        return self.__seed
+
+    def is_generated(self):
+        """Returns True once the mines have been placed"""
+        return self.__data is not None
+
+    def get_mines_count(self):
+        """Returns the number of mines in the board"""
+        return self.__mines_count
+
+    def get_value(self, y, x):
+        """Returns "x" for a mine, otherwise the number of
+           surrounding mines"""
+
+        value = self.__data[y * self.__x + x]
+        if value == MINE:
+            return "x"
+        return value
+
+    def get_data(self):
+        """Returns the whole board as a matrix where mines are "x" """
+
+        return [[self.get_value(y, x) for x in range(self.__x)]
+                for y in range(self.__y)]
+
+    def get_mines(self):
+        """Returns list of the mine coordinates [y, x],
+           empty until the first reveal"""
+        return self.__mines
+
+    def get_metrics(self):
+        """
+        Returns the difficulty metrics of the board, see board_metrics.
+        They are counted on the first call after the mines have been
+        placed. None until then."""
+
+        if self.__data is None:
+            return None
+
+        if self.__metrics is None:
+            self.__metrics = board_metrics(self.__data, self.__y, self.__x)
+
+        return self.__metrics
+
+    def three_bv(self):
+        """Returns the 3BV of the board, the least number of clicks
+           needed to reveal every legal tile without flags. None until
+           the mines have been placed."""
+
+        metrics = self.get_metrics()
+        if metrics is None:
+            return None
+        return metrics["three_bv"]
+
+    def is_opened(self, y, x):
+        """Returns True if the tile has been revealed"""
+        return self.__state[y * self.__x + x] & OPENED != 0
+
+    def is_flagged(self, y, x):
+        """Returns True if the tile has been flagged"""
+        return self.__state[y * self.__x + x] & FLAGGED != 0
+
+    def remaining(self):
+        """Returns the number of legal tiles still hidden"""
+        return self.__count
+
+    def remaining_flags(self):
+        """Returns the number of flags player can still place"""
+        return self.__mines_count - self.__flags
+
+    def opened_count(self):
+        """Returns the number of revealed tiles"""
+        return (self.__x * self.__y) - self.__mines_count - self.__count
+
+    def status(self):
+        """
+        Returns the state of the game.
+
+        :return: "playing" while there's still viable tiles to play,
+                 "won" if all the legal tiles are revealed,
+                 "lost" if a mine was revealed."""
+
+        return self.__status
+
+    def reveal(self, y, x):
+        """
+        Reveals the tile in y,x. Empty tiles will reveal the whole
+        area of adjusted empty tiles.
+
+        :return: list of the revealed tiles coordinates (y, x)"""
+
+        return self.reveal_changes(y, x).get_opened()
+
+    @instrument.timed("reveal")
+    def reveal_changes(self, y, x):
+        """
+        Same as reveal but returns everything the reveal changed so
+        that a view can apply it in one go.
+
+        :return: ChangeSet of the revealed tiles, the flags removed
+                 by the revealed area and the new counters"""
+
+        if self.__status != "playing" or self.is_opened(y, x):
+            return self.__changes([], [])
+
+        if self.__data is None:
+            self.generate(y, x)
+
+        value = self.__data[y * self.__x + x]
+
+        if value == MINE:
+            self.__status = "lost"
+            return self.__changes([], [])
+
+        # Reveal an area of adjusted empty tiles.
+        if value == 0:
+            opened, unflagged = self.__reveal_area(y, x)
+        else:
+            opened = [(y, x)]
+            unflagged = [(y, x)] if self.is_flagged(y, x) else []
+            self.__open(y * self.__x + x)
+
+        if self.__count == 0:
+            self.__status = "won"
+
+        return self.__changes(opened, unflagged)
+
+    def chord(self, y, x):
+        """
+        Reveals the neighbours of an opened number when the number
+        of flags around it matches the number.
+
+        :return: list of the revealed tiles coordinates (y, x)"""
+
+        return self.chord_changes(y, x).get_opened()
+
+    def chord_changes(self, y, x):
+        """
+        Same as chord but returns everything it changed. All the
+        neighbours are revealed in one go including the areas opened
+        by empty tiles. A wrongly placed flag loses the game.
+
+        :return: ChangeSet of the revealed tiles, the flags removed
+                 and the new counters"""
+
+        changes = self.__changes([], [])
+
+        if self.__status != "playing" or not self.is_opened(y, x):
+            return changes
+
+        value = self.__data[y * self.__x + x]
+        if value == 0:
+            return changes
+
+        hidden = []
+        flags = 0
+        for n_y in range(max(y - 1, 0), min(y + 2, self.__y)):
+            for n_x in range(max(x - 1, 0), min(x + 2, self.__x)):
+                state = self.__state[n_y * self.__x + n_x]
+                if state & FLAGGED:
+                    flags += 1
+                elif not state & OPENED:
+                    hidden.append((n_y, n_x))
+
+        if flags != value:
+            return changes
+
+        for n_y, n_x in hidden:
+            changes.merge(self.reveal_changes(n_y, n_x))
+
+        return changes
+
+    def toggle_flag(self, y, x):
+        """
+        Flags the tile or removes an existing flag.
+
+        :return: True if the flag was changed
+                 False if there's no more flags left or the tile
+                 can't be flagged."""
+
+        index = y * self.__x + x
+        state = self.__state[index]
+
+        if self.__status != "playing" or state & OPENED:
+            return False
+
+        if not state & FLAGGED:
+
+            # Restricting the number of flags tobe equal to number of bombs
+            if self.remaining_flags() > 0:
+                self.__state[index] = state | FLAGGED
+                self.__flags += 1
+                return True
+            else:
+                return False
+
+        else:
+            self.__state[index] = state & ~FLAGGED
+            self.__flags -= 1
+            return True
+
+    def __changes(self, opened, unflagged):
+        """Wraps the result of a reveal with the current counters"""
+
+        return ChangeSet(opened, unflagged, self.__count,
+                         self.remaining_flags(), self.__status)
+
+    def __open(self, index):
+        """Marks single tile as revealed, removing a possible flag"""
+
+        if self.__state[index] & FLAGGED:
+            self.__flags -= 1
+
+        self.__state[index] = OPENED
+        self.__count -= 1
+
+    def __reveal_area(self, y, x):
+        """Flood fill that reveals the area of adjusted empty tiles
+           and the numbers bordering it. Every tile is visited once.
+
+           :return: list of the revealed tiles coordinates,
+                    list of the flagged tiles among them"""
+
+        data = self.__data
+        state = self.__state
+        height = self.__y
+        width = self.__x
+
+        opened = [(y, x)]
+        unflagged = []
+        if state[y * width + x] & FLAGGED:
+            unflagged.append((y, x))
+        state[y * width + x] = OPENED
+
+        # Queue of the empty tiles whose neighbours still need checking
+        queue = deque(opened)
+
+        while queue:
+            i, p = queue.popleft()
+            left = max(p - 1, 0)
+            right = min(p + 2, width)
+
+            for n_y in range(max(i - 1, 0), min(i + 2, height)):
+                base = n_y * width
+
+                for index in range(base + left, base + right):
+                    tile = state[index]
+                    if not tile & OPENED:
+                        # Revealed area might contain flags.
+                        if tile & FLAGGED:
+                            unflagged.append((n_y, index - base))
+                        state[index] = OPENED
+                        opened.append((n_y, index - base))
+
+                        if data[index] == 0:
+                            queue.append((n_y, index - base))
+
+        self.__count -= len(opened)
+        self.__flags -= len(unflagged)
+
+        return opened, unflagged
+
+
+class ChangeSet:
+    """Changes made to the board by one or more reveals. The view
+       applies them in a single pass instead of updating itself tile
+       by tile while the board is being changed."""
+
+    def __init__(self, opened, unflagged, remaining, remaining_flags,
+                 status):
+        """
+        :param opened: list of the revealed tiles (y, x)
+        :param unflagged: list of the flags removed by the reveal
+        :param remaining: number of legal tiles still hidden
+        :param remaining_flags: number of flags left to place
+        :param status: status of the game after the changes"""
+
+        self.__opened = opened
+        self.__unflagged = unflagged
+        self.__remaining = remaining
+        self.__remaining_flags = remaining_flags
+        self.__status = status
+
+    def get_opened(self):
+        """Returns list of the revealed tiles coordinates"""
+        return self.__opened
+
+    def get_unflagged(self):
+        """Returns list of the flags removed by the revealed tiles"""
+        return self.__unflagged
+
+    def get_remaining(self):
+        """Returns the number of legal tiles still hidden"""
+        return self.__remaining
+
+    def get_remaining_flags(self):
+        """Returns the number of flags player can still place"""
+        return self.__remaining_flags
+
+    def get_status(self):
+        """Returns the status of the game after the changes"""
+        return self.__status
+
+    def merge(self, other):
+        """Adds the later changes to this set. The counters are
+           taken from the later set."""
+
+        self.__opened.extend(other.get_opened())
+        self.__unflagged.extend(other.get_unflagged())
+        self.__remaining = other.get_remaining()
+        self.__remaining_flags = other.get_remaining_flags()
+        self.__status = other.get_status()
+
+
+def generate_board(height, width, mines, rng=None, safe=None,
+                   use_numpy=True):
+    """
+    Places the mines and counts the number indicators for every tile.
+    The counting is vectorized with NumPy when it's available, both
+    ways give the same board for the same random state.
+
+    :param rng: random.Random instance, defaults to the random module.
+    :param safe: (y, x) tile which is kept free of mines together with
+                 its neighbours. If there isn't enough room only the
+                 tile itself is kept free.
+    :param use_numpy: set False to force the pure Python counting.
+    :return: board data as bytearray indexed by y * width + x
+             where mines are MINE,
+             mine coordinates [y, x] in list"""
+
+    if rng is None:
+        rng = random
+
+    excluded = _safe_area(height, width, mines, safe)
+
+    # Every tile gets an index y * width + x and the mines are sampled
+    # without replacement in one go from the tiles left after the
+    # excluded ones.
+    positions = rng.sample(range(height * width - len(excluded)), mines)
+
+    if excluded:
+        positions = [_skip(i, excluded) for i in positions]
+
+    mine_data = [[i // width, i % width] for i in positions]
+
+    if use_numpy and height * width >= NUMPY_LIMIT \
+            and _load_numpy() is not None:
+        data = _count_numpy(height, width, positions)
+    else:
+        data = _count_python(height, width, mine_data)
+
+    for i in positions:
+        data[i] = MINE
+
+    return data, mine_data
+
+
+def board_metrics(data, height, width):
+    """
+    Counts the difficulty metrics of a board in one pass. Every area of
+    connected empty tiles is an opening and is revealed by one click
+    together with the numbers bordering it. Numbers not bordering any
+    opening are isolated and need a click each.
+
+    :param data: board data as returned by generate_board
+    :return: dict of
+             "openings": number of the areas of empty tiles,
+             "isolated": number of the isolated numbers,
+             "three_bv": openings + isolated, the least number of clicks
+                         needed to reveal the board without flags"""
+
+    # Tiles revealed by the openings found so far
+    seen = bytearray(height * width)
+    openings = 0
+    numbers = 0
+    bordering = 0
+
+    for start in range(height * width):
+        value = data[start]
+        if value != 0:
+            if value != MINE:
+                numbers += 1
+            continue
+        if seen[start]:
+            continue
+
+        # Flood fill of a new opening, every tile is visited once.
+        openings += 1
+        seen[start] = 1
+        queue = [start]
+        while queue:
+            i, p = divmod(queue.pop(), width)
+            left = max(p - 1, 0)
+            right = min(p + 2, width)
+
+            for n_y in range(max(i - 1, 0), min(i + 2, height)):
+                base = n_y * width
+                for index in range(base + left, base + right):
+                    if not seen[index]:
+                        seen[index] = 1
+                        if data[index] == 0:
+                            queue.append(index)
+                        else:
+                            bordering += 1
+
+    isolated = numbers - bordering
+
+    return {"openings": openings,
+            "isolated": isolated,
+            "three_bv": openings + isolated}
+
+
+def _safe_area(height, width, mines, safe):
+    """Returns sorted list of the tile indices that can't hold a mine"""
+
+    if safe is None:
+        return []
+
+    y, x = safe
+    area = [i * width + p
+            for i in range(max(y - 1, 0), min(y + 2, height))
+            for p in range(max(x - 1, 0), min(x + 2, width))]
+
+    if mines <= height * width - len(area):
+        return area
+    elif mines < height * width:
+        return [y * width + x]
+    else:
+        return []
+
+
+def _skip(index, excluded):
+    """Maps index of the remaining tiles to the index of the whole board
+       by stepping over the sorted excluded indices."""
+
+    for i in excluded:
+        if i <= index:
+            index += 1
+        else:
+            break
+
+    return index
+
+
+def _count_python(height, width, mine_data):
+    """Counts the surrounding mines by adding one to the 3x3 area
+       around every mine."""
+
+    # Creating extra row and column each side to
+    # avoid index errors around the edges.
+    padded_width = width + 2
+    padded = bytearray((height + 2) * padded_width)
+
+    for y, x in mine_data:
+        for base in range(y * padded_width + x,
+                          (y + 3) * padded_width + x, padded_width):
+            padded[base] += 1
+            padded[base + 1] += 1
+            padded[base + 2] += 1
+
+    data = bytearray()
+    for y in range(1, height + 1):
+        data += padded[y * padded_width + 1:(y + 1) * padded_width - 1]
+
+    return data
+
+
+def _load_numpy():
+    """Imports NumPy on the first call, returns None if it's missing"""
+
+    global numpy, _numpy_loaded
+
+    if not _numpy_loaded:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+
+        numpy = module
+        _numpy_loaded = True
+
+    return numpy
+
+
+def _count_numpy(height, width, positions):
+    """Counts the surrounding mines as a sum of the nine shifted
+       copies of the padded mine grid."""
+
+    grid = numpy.zeros((height + 2) * (width + 2), dtype=numpy.uint8)
+
+    # Moves the flat indices into the padded grid.
+    positions = numpy.asarray(positions, dtype=numpy.int64)
+    grid[(positions // width + 1) * (width + 2) + positions % width + 1] = 1
+    grid = grid.reshape(height + 2, width + 2)
+
+    counts = numpy.zeros((height, width), dtype=numpy.uint8)
+    for d_y in range(3):
+        for d_x in range(3):
+            counts += grid[d_y:d_y + height, d_x:d_x + width]
+
+    return bytearray(counts.tobytes())
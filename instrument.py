@@ -0,0 +1,228 @@
+"""
+Opt-in timings of the hot paths of the game.
+
+Instrumentation is turned on with the MINESWEEPER_INSTRUMENT environment
+variable or the --instrument flag of the game. Functions decorated with
+timed() then add their wall time to a histogram of their name and
+count() keeps plain counters. Everything stays in memory until it's
+dumped as JSON. When turned off the decorator only checks a flag.
+
+A single game can also be captured with cProfile to find out where
+a slow press spends its time.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from atomicfile import write_atomic
+
+# Set to anything but "" or "0" to turn the instrumentation on
+ENV_VARIABLE = "MINESWEEPER_INSTRUMENT"
+
+# Upper bounds of the histogram buckets in milliseconds, the last
+# bucket holds the slower calls.
+BUCKETS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+_enabled = os.environ.get(ENV_VARIABLE, "") not in ("", "0")
+
+# Timings and counters are also updated from the worker threads.
+_lock = threading.Lock()
+
+# {name: Timing}
+_timings = {}
+
+# {name: int}
+_counters = {}
+
+# cProfile.Profile of the game being captured
+_profiler = None
+_profile_requested = False
+
+
+class Timing:
+    """Call count, total, extremes and histogram of one timed name"""
+
+    def __init__(self):
+        self.__count = 0
+        self.__total = 0.0
+        self.__min = None
+        self.__max = 0.0
+        self.__buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, milliseconds):
+        """Adds the time of a call"""
+
+        self.__count += 1
+        self.__total += milliseconds
+        if self.__min is None or milliseconds < self.__min:
+            self.__min = milliseconds
+        if milliseconds > self.__max:
+            self.__max = milliseconds
+        self.__buckets[bisect_left(BUCKETS, milliseconds)] += 1
+
+    def get_count(self):
+        """Returns the number of calls"""
+        return self.__count
+
+    def get_mean(self):
+        """Returns the mean time of a call in milliseconds"""
+        return self.__total / self.__count if self.__count else 0.0
+
+    def get_max(self):
+        """Returns the slowest call in milliseconds"""
+        return self.__max
+
+    def to_dict(self):
+        """Returns the timing in a JSON friendly format"""
+
+        labels = ["<={:g}ms".format(bound) for bound in BUCKETS]
+        labels.append(">{:g}ms".format(BUCKETS[-1]))
+
+        return {"count": self.__count,
+                "total_ms": self.__total,
+                "mean_ms": self.get_mean(),
+                "min_ms": self.__min,
+                "max_ms": self.__max,
+                "histogram": dict(zip(labels, self.__buckets))}
+
+
+def is_enabled():
+    """Returns True if the timings are being recorded"""
+    return _enabled
+
+
+def enable():
+    """Starts recording the timings"""
+
+    global _enabled
+    _enabled = True
+
+
+def timed(name):
+    """
+    Decorator recording the wall time of every call under the name.
+
+    :param name: name of the histogram, several functions may share it"""
+
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - start) * 1000)
+
+        return wrapper
+
+    return decorator
+
+
+def record(name, milliseconds):
+    """Adds a time to the histogram of the name"""
+
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = Timing()
+        timing.add(milliseconds)
+
+
+def count(name, value=1):
+    """Adds the value to the counter of the name if enabled"""
+
+    if not _enabled:
+        return
+
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot():
+    """Returns a copy of the timings and the counters as a dict"""
+
+    with _lock:
+        return {"timings": {name: timing.to_dict()
+                            for name, timing in sorted(_timings.items())},
+                "counters": dict(sorted(_counters.items()))}
+
+
+def reset():
+    """Forgets the recorded timings and counters"""
+
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+
+def report():
+    """Returns the timings and the counters as text, one per line"""
+
+    with _lock:
+        lines = ["{:<16s}{:>8s}{:>10s}{:>10s}".format("", "calls",
+                                                      "mean ms", "max ms")]
+        for name, timing in sorted(_timings.items()):
+            lines.append("{:<16s}{:>8d}{:>10.2f}{:>10.2f}".format(
+                name, timing.get_count(), timing.get_mean(),
+                timing.get_max()))
+
+        for name, value in sorted(_counters.items()):
+            lines.append("{:<16s}{:>8d}".format(name, value))
+
+    return "\n".join(lines)
+
+
+def dump(path):
+    """Writes the snapshot as JSON into path"""
+
+    write_atomic(path, json.dumps(snapshot(), indent=2))
+
+
+def request_profile():
+    """Asks the next game to be captured with cProfile"""
+
+    global _profile_requested
+    _profile_requested = True
+
+
+def is_profile_requested():
+    """Returns True if the next game should be captured"""
+    return _profile_requested
+
+
+def is_profiling():
+    """Returns True while a game is being captured"""
+    return _profiler is not None
+
+
+def start_profile():
+    """Starts capturing the calls of this thread with cProfile"""
+
+    global _profiler, _profile_requested
+
+    import cProfile
+
+    _profile_requested = False
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+
+def stop_profile(path):
+    """Stops the capture and writes it into path in the pstats format"""
+
+    global _profiler
+
+    profiler = _profiler
+    _profiler = None
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(path)
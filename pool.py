@@ -0,0 +1,204 @@
+"""
+Pool of pregenerated boards that can be solved without guessing.
+
+Finding such a board takes many tries on the harder difficulties, so
+worker processes keep a few boards ready for every board size that has
+been asked for. New Game takes one out instantly and the workers start
+on its replacement. The boards are saved to the disk when the program
+closes so the next start has them ready too.
+
+A board is stored as the seed of its mine layout and the tile the
+first press has to be made on, see solver.find_no_guess_board.
+
+Sizes that hardly ever have such a board are given up on after a few
+empty handed searches, so the workers don't keep a core busy for the
+whole session.
+"""
+
+import json
+import multiprocessing
+import random
+import threading
+
+from atomicfile import write_atomic
+from solver import find_no_guess_board
+
+# Boards kept ready for every size
+POOL_SIZE = 5
+
+# Boards a worker tries before returning empty handed
+ATTEMPTS = 200
+
+# Empty handed searches in a row after which a size is given up on
+MAX_FAILURES = 3
+
+
+class BoardPool:
+    """Ready made no-guess boards for every board size"""
+
+    def __init__(self, path, size=POOL_SIZE, workers=1):
+        """
+        :param path: file the boards are kept in between the sessions
+        :param size: number of boards kept ready for every size
+        :param workers: number of worker processes"""
+
+        self.__path = path
+        self.__size = size
+        self.__workers = workers
+
+        # {"height x width x mines": [[seed, y, x], ...]}, read from
+        # the file when first needed.
+        self.__boards = None
+
+        # Number of searches running for every size
+        self.__running = {}
+
+        # Empty handed searches in a row for every size
+        self.__failures = {}
+
+        self.__workers_pool = None
+        self.__closed = False
+        self.__changed = False
+        self.__lock = threading.Lock()
+
+    def take(self, height, width, mines):
+        """
+        Takes a ready board out of the pool and starts the workers
+        on a replacement.
+
+        :return: (seed, y, x) of the board, None if there's none ready"""
+
+        key = self.__key(height, width, mines)
+
+        with self.__lock:
+            boards = self.__load().get(key)
+            board = None
+            if boards:
+                board = tuple(boards.pop(0))
+                self.__changed = True
+
+        self.fill(height, width, mines)
+        return board
+
+    def count(self, height, width, mines):
+        """Returns the number of ready boards of the size"""
+
+        with self.__lock:
+            return len(self.__load().get(self.__key(height, width,
+                                                    mines), []))
+
+    def fill(self, height, width, mines):
+        """Starts the workers needed to fill the pool of the size"""
+
+        key = self.__key(height, width, mines)
+
+        with self.__lock:
+            if self.__closed:
+                return
+
+            if self.__failures.get(key, 0) >= MAX_FAILURES:
+                return
+
+            missing = self.__size - len(self.__load().get(key, [])) \
+                - self.__running.get(key, 0)
+            if missing <= 0:
+                return
+
+            if self.__workers_pool is None:
+                # Workers are started from scratch instead of forked
+                # from the UI process and its threads.
+                self.__workers_pool = multiprocessing.get_context(
+                    "spawn").Pool(processes=self.__workers)
+
+            size = (height, width, mines)
+            for i in range(missing):
+                try:
+                    self.__workers_pool.apply_async(
+                        find_no_guess_board,
+                        (height, width, mines,
+                         random.Random(random.randrange(2 ** 64)),
+                         ATTEMPTS),
+                        callback=lambda board, size=size:
+                        self.__done(size, board),
+                        error_callback=lambda error, size=size:
+                        self.__done(size, None))
+                except ValueError:
+                    # The pool was closed in between.
+                    return
+
+                self.__running[key] = self.__running.get(key, 0) + 1
+
+    def save(self):
+        """Writes the ready boards to the disk if they have changed"""
+
+        with self.__lock:
+            if not self.__changed or self.__boards is None:
+                return
+
+            write_atomic(self.__path, json.dumps(self.__boards,
+                                                 sort_keys=True))
+            self.__changed = False
+
+    def close(self):
+        """Stops the workers right away and saves the ready boards.
+           The searches still running are thrown away."""
+
+        with self.__lock:
+            self.__closed = True
+            workers_pool = self.__workers_pool
+            self.__workers_pool = None
+
+        if workers_pool is not None:
+            workers_pool.terminate()
+
+        try:
+            self.save()
+        except OSError:
+            # The boards will be generated again next time.
+            pass
+
+    def __done(self, size, board):
+        """Stores the board found by a worker, None if it found none.
+           Called on the result thread of the workers."""
+
+        key = self.__key(*size)
+
+        with self.__lock:
+            self.__running[key] -= 1
+
+            if board is None:
+                self.__failures[key] = self.__failures.get(key, 0) + 1
+            else:
+                self.__failures[key] = 0
+                boards = self.__boards.setdefault(key, [])
+                if len(boards) < self.__size:
+                    boards.append(list(board))
+                    self.__changed = True
+
+        # Starts the next search unless the size has been given up on.
+        self.fill(*size)
+
+    def __load(self):
+        """Returns the boards, reading the file on the first call.
+           Called with the lock held."""
+
+        if self.__boards is None:
+            self.__boards = {}
+            try:
+                with open(self.__path, "r") as file:
+                    document = json.load(file)
+
+                for key, boards in document.items():
+                    self.__boards[key] = [
+                        list(board) for board in boards
+                        if isinstance(board, list) and len(board) == 3
+                        and all(isinstance(i, int) for i in board)]
+
+            except (OSError, ValueError, AttributeError):
+                # A missing or broken file only means an empty pool.
+                pass
+
+        return self.__boards
+
+    def __key(self, height, width, mines):
+        return "{:d}x{:d}x{:d}".format(height, width, mines)
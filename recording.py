@@ -0,0 +1,401 @@
+"""
+Game recordings and their replay.
+
+A recording holds the size, mines and seed of the board and every
+action the player made as (milliseconds since the previous action,
+action, tile). The seed gives the same mine layout again, so replaying
+the actions on a new Board rebuilds any position of the game without
+tkinter in time linear to the number of actions.
+
+Recordings are stored in a compact binary format. After the header
+every action takes two unsigned LEB128 varints: the time delta and
+the tile index y * width + x shifted left by two with the action in
+the low bits. A typical action fits in three to four bytes.
+
+The recording of every finished game is written by a Writer thread so
+the end of a game doesn't wait for the disk.
+"""
+
+import queue
+import threading
+
+from atomicfile import write_atomic
+from engine import Board
+
+# Actions of the player
+REVEAL = 0
+FLAG = 1
+CHORD = 2
+
+ACTION_NAMES = {REVEAL: "reveal", FLAG: "flag", CHORD: "chord"}
+
+# File starts with these bytes followed by the format version.
+# Version 2 added the tile the mines were placed around.
+MAGIC = b"MSRC"
+VERSION = 2
+
+
+class Recording:
+    """Actions of one game together with the board they were made on"""
+
+    def __init__(self, height, width, mines, seed, mode="", start=None):
+        """
+        :param seed: int seed of the board, see Board.get_seed()
+        :param mode: name of the difficulty, only informative
+        :param start: (y, x) tile the mines were placed around before
+                      the game started, None if they were placed on
+                      the first press"""
+
+        if not isinstance(seed, int):
+            raise ValueError("only boards with an int seed can be recorded")
+
+        self.__height = height
+        self.__width = width
+        self.__mines = mines
+        self.__seed = seed
+        self.__mode = mode
+        self.__start = start
+
+        # (delta milliseconds, action, index) tuples
+        self.__events = []
+
+        # Time of the previous action in milliseconds
+        self.__last = 0
+
+    def add(self, action, y, x, elapsed):
+        """
+        Records an action.
+
+        :param elapsed: game time of the action in milliseconds"""
+
+        delta = max(elapsed - self.__last, 0)
+        self.__last = max(elapsed, self.__last)
+        self.__events.append((delta, action, y * self.__width + x))
+
+    def get_height(self):
+        """Returns the number of rows in the board"""
+        return self.__height
+
+    def get_width(self):
+        """Returns the number of columns in the board"""
+        return self.__width
+
+    def get_mines_count(self):
+        """Returns the number of mines in the board"""
+        return self.__mines
+
+    def get_seed(self):
+        """Returns the seed of the board"""
+        return self.__seed
+
+    def get_mode(self):
+        """Returns the name of the difficulty"""
+        return self.__mode
+
+    def get_start(self):
+        """Returns the tile the mines were placed around or None"""
+        return self.__start
+
+    def get_event_count(self):
+        """Returns the number of recorded actions"""
+        return len(self.__events)
+
+    def get_event(self, position):
+        """Returns the action at the position as (delta milliseconds,
+           action, y, x)"""
+
+        delta, action, index = self.__events[position]
+        return delta, action, index // self.__width, index % self.__width
+
+    def get_duration(self):
+        """Returns the game time of the last action in milliseconds"""
+        return self.__last
+
+    def create_board(self):
+        """Returns a new Board with the recorded mine layout"""
+
+        board = Board(self.__height, self.__width, self.__mines,
+                      seed=self.__seed)
+        if self.__start is not None:
+            board.generate(self.__start[0], self.__start[1])
+
+        return board
+
+    def to_bytes(self):
+        """Encodes the recording in the binary format"""
+
+        data = bytearray(MAGIC)
+        mode = self.__mode.encode("utf-8")
+
+        for value in (VERSION, self.__height, self.__width, self.__mines,
+                      self.__seed, len(mode)):
+            _write_varint(data, value)
+        data += mode
+
+        # Zero when there's no start tile, otherwise its index plus one
+        if self.__start is None:
+            _write_varint(data, 0)
+        else:
+            _write_varint(data, self.__start[0] * self.__width
+                          + self.__start[1] + 1)
+
+        _write_varint(data, len(self.__events))
+        for delta, action, index in self.__events:
+            _write_varint(data, delta)
+            _write_varint(data, index << 2 | action)
+
+        return bytes(data)
+
+    def save(self, path):
+        """Writes the recording into path, see atomicfile"""
+
+        write_atomic(path, self.to_bytes())
+
+
+class Writer:
+    """Writes recordings in the background. Recordings are encoded
+       when queued, so the game may go on changing afterwards."""
+
+    def __init__(self):
+        # (path, data) waiting to be written, None stops the writer.
+        self.__queue = queue.Queue()
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def save(self, recording, path):
+        """Queues the recording to be written into path"""
+
+        self.__queue.put((path, recording.to_bytes()))
+
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__write_loop,
+                                                 name="recording-writer",
+                                                 daemon=True)
+                self.__thread.start()
+
+    def flush(self):
+        """Waits until every queued recording has been written"""
+
+        self.__queue.join()
+
+    def close(self):
+        """Writes the queued recordings and stops the writer"""
+
+        with self.__lock:
+            thread = self.__thread
+            self.__thread = None
+
+        if thread is not None:
+            self.__queue.put(None)
+            thread.join()
+
+    def __write_loop(self):
+        while True:
+            item = self.__queue.get()
+            try:
+                if item is None:
+                    return
+
+                write_atomic(item[0], item[1])
+            except OSError:
+                # The game goes on without the recording.
+                pass
+            finally:
+                self.__queue.task_done()
+
+
+class Replay:
+    """Plays the actions of a recording on a new board one by one"""
+
+    def __init__(self, recording):
+
+        self.__recording = recording
+        self.__board = recording.create_board()
+
+        # Number of actions applied
+        self.__position = 0
+
+    def get_board(self):
+        """Returns the board at the current position"""
+        return self.__board
+
+    def get_position(self):
+        """Returns the number of actions applied"""
+        return self.__position
+
+    def is_finished(self):
+        """Returns True when every action has been applied"""
+        return self.__position >= self.__recording.get_event_count()
+
+    def get_next_delay(self):
+        """Returns the milliseconds the player waited before the next
+           action, None at the end"""
+
+        if self.is_finished():
+            return None
+        return self.__recording.get_event(self.__position)[0]
+
+    def step(self):
+        """
+        Applies the next action.
+
+        :return: (action, y, x, changes) where changes is the ChangeSet
+                 of a reveal or a chord and None for a flag,
+                 None if there are no actions left."""
+
+        if self.is_finished():
+            return None
+
+        delta, action, y, x = self.__recording.get_event(self.__position)
+        self.__position += 1
+
+        if action == REVEAL:
+            return action, y, x, self.__board.reveal_changes(y, x)
+        elif action == CHORD:
+            return action, y, x, self.__board.chord_changes(y, x)
+        else:
+            self.__board.toggle_flag(y, x)
+            return action, y, x, None
+
+    def seek(self, position):
+        """Moves to the position, going back starts again from the
+           beginning. Returns the board."""
+
+        position = min(max(position, 0), self.__recording.get_event_count())
+
+        if position < self.__position:
+            self.__board = self.__recording.create_board()
+            self.__position = 0
+
+        while self.__position < position:
+            self.step()
+
+        return self.__board
+
+
+def from_bytes(data):
+    """
+    Decodes a recording from the binary format.
+
+    :raises ValueError: if the data isn't a valid recording"""
+
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a recording")
+
+    try:
+        position = len(MAGIC)
+        header = []
+        for i in range(6):
+            value, position = _read_varint(data, position)
+            header.append(value)
+
+        version, height, width, mines, seed, length = header
+        if version not in (1, VERSION):
+            raise ValueError("unsupported recording version {:d}"
+                             .format(version))
+        if height < 1 or width < 1 or mines >= height * width:
+            raise ValueError("invalid board size")
+
+        mode = bytes(data[position:position + length]).decode("utf-8")
+        position += length
+
+        start = None
+        if version >= 2:
+            value, position = _read_varint(data, position)
+            if value > height * width:
+                raise ValueError("invalid start tile")
+            if value:
+                start = divmod(value - 1, width)
+
+        recording = Recording(height, width, mines, seed, mode, start)
+
+        count, position = _read_varint(data, position)
+        elapsed = 0
+        for i in range(count):
+            delta, position = _read_varint(data, position)
+            value, position = _read_varint(data, position)
+
+            index = value >> 2
+            if value & 3 not in ACTION_NAMES or index >= height * width:
+                raise ValueError("invalid action")
+
+            elapsed += delta
+            recording.add(value & 3, index // width, index % width, elapsed)
+
+    except (IndexError, UnicodeDecodeError):
+        raise ValueError("truncated recording")
+
+    return recording
+
+
+def load(path):
+    """Reads a recording file, see from_bytes"""
+
+    with open(path, "rb") as file:
+        return from_bytes(file.read())
+
+
+def replay(recording, position=None):
+    """
+    Rebuilds the board after the given number of actions.
+
+    :param position: number of actions to apply, all if not given
+    :return: Board at the position"""
+
+    if position is None:
+        position = recording.get_event_count()
+
+    return Replay(recording).seek(position)
+
+
+def format_board(board):
+    """Returns the board as text, one row per line. Hidden tiles are
+       ".", flags "f", revealed mines "x" and empty tiles " "."""
+
+    lost = board.status() == "lost"
+    mines = set()
+    if lost:
+        mines = {(y, x) for y, x in board.get_mines()}
+
+    lines = []
+    for y in range(board.get_height()):
+        row = []
+        for x in range(board.get_width()):
+            if board.is_opened(y, x):
+                value = board.get_value(y, x)
+                row.append(str(value) if value else " ")
+            elif board.is_flagged(y, x):
+                row.append("f")
+            elif (y, x) in mines:
+                row.append("x")
+            else:
+                row.append(".")
+        lines.append("".join(row))
+
+    return "\n".join(lines)
+
+
+def _write_varint(data, value):
+    """Appends an unsigned LEB128 varint to the bytearray"""
+
+    while value > 0x7f:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _read_varint(data, position):
+    """Reads an unsigned LEB128 varint.
+
+       :return: the value, position after it"""
+
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
@@ -0,0 +1,175 @@
+"""
+Batch simulation of seeded games played by the solver.
+
+Games are split into chunks of seeds and spread over worker processes.
+Per game results are streamed as they come in and the win rate and the
+throughput are reported at the end. Run through the main program:
+
+    python Minesweeper.py simulate --mode advanced --games 100000
+"""
+
+import os
+import random
+import sys
+import time
+
+from engine import Board
+
+
+def add_arguments(parser, modes):
+    """Adds the simulate command line options to an argparse parser
+
+    :param modes: list of the available mode names"""
+
+    parser.add_argument("--mode", choices=modes, default=modes[0],
+                        help="difficulty to simulate")
+    parser.add_argument("--height", type=int,
+                        help="rows of the custom board, defaults to the "
+                             "saved custom size")
+    parser.add_argument("--width", type=int,
+                        help="columns of the custom board")
+    parser.add_argument("--mines", type=int,
+                        help="mines of the custom board")
+    parser.add_argument("--games", type=int, default=1000,
+                        help="number of games to play")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first game, the rest follow it")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write per game results as CSV, - for stdout")
+
+
+def play_games(height, width, mines, seeds):
+    """
+    Plays one game for every seed.
+
+    :return: list of (seed, result, clicks, seconds, three_bv, openings,
+             isolated) tuples"""
+
+    # The game imports this module on startup, the solver isn't needed
+    # until the games are played.
+    from solver import play
+
+    results = []
+    for seed in seeds:
+        start = time.perf_counter()
+
+        board = Board(height, width, mines, seed=seed)
+        clicks = play(board, random.Random(seed))
+
+        elapsed = time.perf_counter() - start
+
+        # The metrics are counted outside of the game time.
+        metrics = board.get_metrics()
+        results.append((seed, board.status(), clicks, elapsed,
+                        metrics["three_bv"], metrics["openings"],
+                        metrics["isolated"]))
+
+    return results
+
+
+def simulate(height, width, mines, games, workers=1, seed=0,
+             callback=None):
+    """
+    Plays the games over a pool of worker processes.
+
+    :param callback: function called with every game result tuple
+                     as soon as its chunk finishes.
+    :return: dict of the aggregated statistics"""
+
+    seeds = range(seed, seed + games)
+
+    # Enough chunks to keep every worker busy but big enough that the
+    # process communication stays cheap.
+    size = max(1, min(1000, games // (max(workers, 1) * 8)))
+    chunks = [seeds[i:i + size] for i in range(0, games, size)]
+
+    wins = 0
+    clicks = 0
+    game_time = 0.0
+    three_bv = 0
+    won_three_bv = 0
+    start = time.perf_counter()
+
+    def collect(results):
+        nonlocal wins, clicks, game_time, three_bv, won_three_bv
+        for result in results:
+            if result[1] == "won":
+                wins += 1
+                won_three_bv += result[4]
+            clicks += result[2]
+            game_time += result[3]
+            three_bv += result[4]
+
+            if callback is not None:
+                callback(result)
+
+    if workers <= 1:
+        for chunk in chunks:
+            collect(play_games(height, width, mines, chunk))
+    else:
+        # Only imported here for the same reason as the solver.
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(play_games, height, width, mines,
+                                       chunk)
+                       for chunk in chunks]
+            for future in as_completed(futures):
+                collect(future.result())
+
+    elapsed = time.perf_counter() - start
+
+    return {"games": games,
+            "wins": wins,
+            "win_rate": wins / games if games else 0.0,
+            "mean_clicks": clicks / games if games else 0.0,
+            "mean_game_time": game_time / games if games else 0.0,
+            "mean_three_bv": three_bv / games if games else 0.0,
+            "mean_won_three_bv": won_three_bv / wins if wins else 0.0,
+            "elapsed": elapsed,
+            "games_per_second": games / elapsed if elapsed else 0.0}
+
+
+def run(args, height, width, mines):
+    """Runs the simulate command with the parsed arguments"""
+
+    output = None
+    if args.output == "-":
+        output = sys.stdout
+    elif args.output:
+        output = open(args.output, "w")
+
+    def write(result):
+        output.write("{:d},{:s},{:d},{:.6f},{:d},{:d},{:d}\n"
+                     .format(*result))
+
+    try:
+        if output is not None:
+            output.write("seed,result,clicks,seconds,three_bv,openings,"
+                         "isolated\n")
+
+        stats = simulate(height, width, mines, args.games, args.workers,
+                         args.seed, write if output is not None else None)
+    finally:
+        if output is not None and output is not sys.stdout:
+            output.close()
+
+    # Keeps the summary out of the CSV when it goes to stdout.
+    report = sys.stderr if output is sys.stdout else sys.stdout
+
+    print("Mode: {:s} ({:d}x{:d}, {:d} mines)"
+          .format(args.mode, height, width, mines), file=report)
+    print("Games: {:d}  Wins: {:d}  Win rate: {:.2%}"
+          .format(stats["games"], stats["wins"], stats["win_rate"]),
+          file=report)
+    print("Mean clicks: {:.1f}  Mean game time: {:.2f} ms"
+          .format(stats["mean_clicks"], stats["mean_game_time"] * 1000),
+          file=report)
+    print("Mean 3BV: {:.1f}  Mean 3BV of the won games: {:.1f}"
+          .format(stats["mean_three_bv"], stats["mean_won_three_bv"]),
+          file=report)
+    print("Elapsed: {:.2f} s  Throughput: {:.0f} games/s with {:d} workers"
+          .format(stats["elapsed"], stats["games_per_second"],
+                  args.workers), file=report)
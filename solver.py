@@ -0,0 +1,786 @@
+"""
+Minesweeper solver working on top of the Board engine.
+
+The solver only looks at what a player can see: the revealed numbers.
+It keeps a constraint for every revealed number that still has hidden
+neighbours and deduces safe tiles and mines from them in three steps,
+cheapest first:
+
+    1. Single tile rules. A number whose remaining mines equal zero or
+       the count of its hidden neighbours decides all of them.
+    2. Subset and pair rules between two overlapping numbers.
+    3. Exact enumeration of the frontier components. Only used when
+       nothing is forced by the rules above.
+
+The same enumeration gives the mine probability of every hidden tile
+when it's combined over the components with the number of mines left.
+Boards the solver can finish without guessing are found by trying
+seeds until one is solved from its first press.
+
+After every reveal the solver is told about the revealed tiles and only
+the numbers around them get checked again.
+"""
+
+import random
+from math import comb
+
+from engine import Board
+
+# Solver knowledge of a hidden tile.
+UNKNOWN = 0
+SAFE = 1
+MINE = 2
+
+# Most states the enumeration of one frontier component may go
+# through. The tile count alone doesn't matter, long frontiers have
+# few states, but tangled ones can grow exponentially and are left
+# unsolved.
+MAX_STATES = 200000
+
+
+class Solver:
+    """Deduces safe tiles and mines from the revealed numbers of a board"""
+
+    def __init__(self, board):
+        self.__board = board
+        self.__y = board.get_height()
+        self.__x = board.get_width()
+
+        # What the solver knows about every tile. Indexed y * width + x.
+        self.__known = bytearray(self.__y * self.__x)
+
+        # Number of known mines
+        self.__mines = 0
+
+        # Hidden tiles known to be safe but not revealed yet
+        self.__safe = set()
+
+        # Revealed numbers with unknown neighbours.
+        # index: [set of unknown neighbours, mines left among them]
+        self.__constraints = {}
+
+        # Constraints changed since they were last checked by
+        # the single tile rules and by the pair rules.
+        self.__dirty = set()
+        self.__pair_dirty = set()
+
+        # Enumeration results of the frontier components by their
+        # constraints. A reveal only changes the components it touches
+        # so the rest are found here on the next round.
+        self.__enumerated = {}
+
+        # Reads the tiles already revealed.
+        opened = []
+        for y in range(self.__y):
+            for x in range(self.__x):
+                if board.is_opened(y, x):
+                    opened.append((y, x))
+
+        self.update(opened)
+
+    def neighbours(self, index):
+        """Returns list of the tile indices around the given index"""
+
+        y, x = divmod(index, self.__x)
+        width = self.__x
+
+        return [i * width + p
+                for i in range(max(y - 1, 0), min(y + 2, self.__y))
+                for p in range(max(x - 1, 0), min(x + 2, width))
+                if i != y or p != x]
+
+    def update(self, opened):
+        """
+        Fast path used after every reveal. Only the constraints around
+        the revealed tiles are touched.
+
+        :param opened: list of the revealed tiles coordinates (y, x)"""
+
+        for y, x in opened:
+            index = y * self.__x + x
+
+            if self.__known[index] == MINE:
+                # Can only happen if the board was revealed by
+                # someone else than the solver.
+                continue
+
+            self.__known[index] = SAFE
+            self.__safe.discard(index)
+            self.__remove_unknown(index, False)
+
+        for y, x in opened:
+            self.__add_constraint(y * self.__x + x)
+
+    def is_mine(self, y, x):
+        """Returns True if the solver has deduced a mine in y,x"""
+        return self.__known[y * self.__x + x] == MINE
+
+    def get_mines(self):
+        """Returns list of the deduced mine coordinates (y, x)"""
+
+        return [divmod(i, self.__x)
+                for i in range(len(self.__known)) if self.__known[i] == MINE]
+
+    def get_safe(self):
+        """Returns list of the hidden tiles known to be safe (y, x)"""
+
+        return [divmod(i, self.__x) for i in sorted(self.__safe)]
+
+    def hint(self):
+        """
+        Answers which tile is safe to press.
+
+        :return: coordinates (y, x) of a safe tile or
+                 None if no tile is certainly safe."""
+
+        # Before the first press every tile is safe.
+        if self.__board.opened_count() == 0:
+            return self.__y // 2, self.__x // 2
+
+        if not self.__safe:
+            self.solve()
+
+        if self.__safe:
+            return divmod(min(self.__safe), self.__x)
+
+        return None
+
+    def solve(self):
+        """
+        Runs the rules until new safe tiles are found or nothing more
+        can be deduced.
+
+        :return: True if there's known safe tiles to press"""
+
+        while not self.__safe:
+
+            if self.__dirty:
+                self.__single_rules()
+            elif self.__pair_dirty:
+                self.__pair_rules()
+            elif not self.__global_rule() and not self.__enumerate():
+                break
+
+        return len(self.__safe) > 0
+
+    def frontier_components(self):
+        """
+        Splits the unknown tiles next to the revealed numbers into
+        components that don't share any constraints.
+
+        :return: list of (tiles, constraints) pairs where both are
+                 lists of indices"""
+
+        constraints = self.__constraints
+        seen = set()
+        components = []
+
+        for start in constraints:
+            if start in seen:
+                continue
+
+            seen.add(start)
+            stack = [start]
+            tiles = set()
+            group = []
+
+            while stack:
+                index = stack.pop()
+                group.append(index)
+
+                for tile in constraints[index][0]:
+                    if tile in tiles:
+                        continue
+                    tiles.add(tile)
+
+                    for neighbour in self.neighbours(tile):
+                        if neighbour in constraints \
+                                and neighbour not in seen:
+                            seen.add(neighbour)
+                            stack.append(neighbour)
+
+            components.append((self.__order(tiles, group), group))
+
+        return components
+
+    def __order(self, tiles, group):
+        """Orders the tiles of a component so that neighbouring tiles
+           come one after another. That way the constraints get fully
+           assigned early and the enumeration can prune sooner."""
+
+        constraints = self.__constraints
+        ordered = []
+        seen = set()
+
+        for start in sorted(tiles):
+            if start in seen:
+                continue
+
+            seen.add(start)
+            queue = [start]
+
+            for tile in queue:
+                ordered.append(tile)
+
+                for neighbour in self.neighbours(tile):
+                    constraint = constraints.get(neighbour)
+                    if constraint is None:
+                        continue
+
+                    for other in sorted(constraint[0]):
+                        if other not in seen:
+                            seen.add(other)
+                            queue.append(other)
+
+        return ordered
+
+    def enumerate_component(self, tiles, group):
+        """
+        Counts every valid mine configuration of a frontier component.
+
+        The tiles are assigned one by one and the state between two
+        steps is the mines still needed by each constraint. Counting
+        the completions of every state once from the end (backward)
+        and the ways to reach it from the start (forward) gives the
+        configuration counts without walking through every
+        configuration separately.
+
+        :return: dict {mines: [configurations, [per tile mine counts]]}
+                 or None if the component has too many states."""
+
+        constraints = self.__constraints
+        count = len(tiles)
+        position = {tile: i for i, tile in enumerate(tiles)}
+
+        # Constraints touching each tile
+        touching = [[] for i in tiles]
+        for c, index in enumerate(group):
+            for tile in constraints[index][0]:
+                touching[position[tile]].append(c)
+
+        # Unassigned tiles of every constraint after the tile i
+        # has been assigned.
+        free = [len(constraints[index][0]) for index in group]
+        free_after = []
+        for i in range(count):
+            for c in touching[i]:
+                free[c] -= 1
+            free_after.append(tuple(free))
+
+        def step(i, state, value):
+            """Assigns value to the tile i, None if it's illegal"""
+
+            if not touching[i]:
+                return state
+
+            state = list(state)
+            for c in touching[i]:
+                state[c] -= value
+                if state[c] < 0 or state[c] > free_after[i][c]:
+                    return None
+
+            return tuple(state)
+
+        # States reachable before every tile is assigned. The
+        # transitions are kept so step() runs once per state and value.
+        start = tuple(constraints[index][1] for index in group)
+        layers = [{start}]
+        moves = []
+        states = 1
+
+        for i in range(count):
+            reached = set()
+            layer_moves = {}
+
+            for state in layers[i]:
+                layer_moves[state] = [(value, after)
+                                      for value, after in
+                                      ((0, step(i, state, 0)),
+                                       (1, step(i, state, 1)))
+                                      if after is not None]
+                reached.update(after for value, after
+                               in layer_moves[state])
+
+            states += len(reached)
+            if states > MAX_STATES:
+                return None
+
+            layers.append(reached)
+            moves.append(layer_moves)
+
+        # Completions of every state counted backward from the end,
+        # {state: {mines: ways}} for each layer. Dead ends are left out.
+        completions = [None] * count + [
+            {state: {0: 1} for state in layers[count] if not any(state)}]
+
+        for i in range(count - 1, -1, -1):
+            following = completions[i + 1]
+            current = {}
+
+            for state, state_moves in moves[i].items():
+                result = {}
+                for value, after in state_moves:
+                    for mines, ways in following.get(after, {}).items():
+                        result[mines + value] = result.get(
+                            mines + value, 0) + ways
+
+                if result:
+                    current[state] = result
+
+            completions[i] = current
+
+        totals = completions[0].get(start, {})
+
+        # Per tile count of the configurations having a mine in it
+        mine_counts = [{} for i in tiles]
+
+        # Ways to reach each state {state: {mines: ways}}
+        layer = {start: {0: 1}} if totals else {}
+
+        for i in range(count):
+            following = {}
+
+            for state, reached in layer.items():
+                for value, after in moves[i][state]:
+                    rest = completions[i + 1].get(after)
+                    if not rest:
+                        continue
+
+                    ways_to = following.setdefault(after, {})
+                    for mines, ways in reached.items():
+                        ways_to[mines + value] = ways_to.get(
+                            mines + value, 0) + ways
+
+                        if value:
+                            counts = mine_counts[i]
+                            for more, completed in rest.items():
+                                total = mines + 1 + more
+                                counts[total] = counts.get(total, 0) \
+                                    + ways * completed
+
+            layer = following
+
+        return {mines: [ways, [counts.get(mines, 0)
+                               for counts in mine_counts]]
+                for mines, ways in totals.items()}
+
+    def probabilities(self):
+        """
+        Counts the chance of a mine for every hidden tile from what
+        the player can see. Every frontier component is enumerated on
+        its own and the components are combined by weighting each of
+        their mine counts with the ways the remaining mines fit in the
+        tiles outside the frontier. Components with too many states to
+        enumerate count as outside tiles.
+
+        :return: dict {(y, x): probability} of the hidden tiles"""
+
+        width = self.__x
+        known = self.__known
+        mines_left = self.mines_left()
+
+        components = []
+        framed = set()
+        for tiles, group, results in self.__enumerate_components():
+            if results:
+                components.append((tiles, results))
+                framed.update(tiles)
+
+        outside = [i for i in range(len(known))
+                   if known[i] == UNKNOWN and i not in framed
+                   and not self.__board.is_opened(i // width, i % width)]
+
+        weight = self.__weights(components, len(outside), mines_left)
+
+        result = {}
+        for i in range(len(known)):
+            if known[i] == MINE:
+                result[divmod(i, width)] = 1.0
+        for i in self.__safe:
+            result[divmod(i, width)] = 0.0
+
+        for (tiles, results), weights in zip(components, weight[0]):
+            total = sum(results[k][0] * w for k, w in weights.items())
+            if total == 0:
+                continue
+
+            for p, tile in enumerate(tiles):
+                mines = sum(results[k][1][p] * w for k, w in weights.items())
+                result[divmod(tile, width)] = mines / total
+
+        for tile in outside:
+            result[divmod(tile, width)] = weight[1]
+
+        return result
+
+    def __enumerate_components(self):
+        """
+        Enumerates every frontier component, reusing the results of
+        the components whose constraints haven't changed.
+
+        :return: list of (tiles, constraints, results) where results is
+                 as returned by enumerate_component"""
+
+        components = []
+        cache = {}
+        for tiles, group in self.frontier_components():
+            key = self.__component_key(tiles, group)
+            if key in self.__enumerated:
+                results = self.__enumerated[key]
+            else:
+                results = self.enumerate_component(tiles, group)
+            cache[key] = results
+            components.append((tiles, group, results))
+
+        # Only the results of the current components are kept.
+        self.__enumerated = cache
+
+        return components
+
+    def __component_key(self, tiles, group):
+        """Returns a hashable description of the component constraints"""
+
+        constraints = self.__constraints
+        return (tuple(tiles),
+                tuple((index, constraints[index][1],
+                       frozenset(constraints[index][0]))
+                      for index in sorted(group)))
+
+    def __weights(self, components, outside, mines_left):
+        """
+        Weights of the mine counts of every component: the number of
+        ways the other components and the outside tiles can hold the
+        rest of the mines.
+
+        :return: list of {mines: weight} dicts in the component order,
+                 mine probability of an outside tile"""
+
+        distributions = [{k: results[k][0] for k in results}
+                         for tiles, results in components]
+
+        def convolve(a, b):
+            result = {}
+            for i, ways_a in a.items():
+                for j, ways_b in b.items():
+                    result[i + j] = result.get(i + j, 0) + ways_a * ways_b
+            return result
+
+        # Mine count distributions of the components before and after
+        # each component, so each one is combined with all the others.
+        before = [{0: 1}]
+        for distribution in distributions:
+            before.append(convolve(before[-1], distribution))
+        after = [{0: 1}]
+        for distribution in reversed(distributions):
+            after.append(convolve(after[-1], distribution))
+        after.reverse()
+
+        def fill(mines):
+            """Ways to place the mines in the outside tiles"""
+            if mines < 0 or mines > outside:
+                return 0
+            return comb(outside, mines)
+
+        weights = []
+        for c, distribution in enumerate(distributions):
+            others = convolve(before[c], after[c + 1])
+            weights.append({k: sum(ways * fill(mines_left - k - j)
+                                   for j, ways in others.items())
+                            for k in distribution})
+
+        # Chance of an outside tile is the mean of the mines left for
+        # the outside over every combination.
+        total = 0
+        mines = 0
+        for k, ways in before[-1].items():
+            ways *= fill(mines_left - k)
+            total += ways
+            mines += ways * (mines_left - k)
+
+        if total == 0:
+            # The components alone can't be matched with the mine count,
+            # which happens when a component had too many states.
+            weights = [{k: 1 for k in distribution}
+                       for distribution in distributions]
+            probability = min(max(mines_left, 0) / outside, 1.0) \
+                if outside else 0.0
+        elif outside:
+            probability = mines / total / outside
+        else:
+            probability = 0.0
+
+        return weights, probability
+
+    def unknown_count(self):
+        """Returns number of hidden tiles the solver knows nothing about"""
+
+        hidden = self.__y * self.__x - self.__board.opened_count()
+        return hidden - self.__mines - len(self.__safe)
+
+    def mines_left(self):
+        """Returns number of mines not yet deduced"""
+        return self.__board.get_mines_count() - self.__mines
+
+    def __add_constraint(self, index):
+        """Creates the constraint of a revealed number"""
+
+        y, x = divmod(index, self.__x)
+        value = self.__board.get_value(y, x)
+
+        if value == 0 or index in self.__constraints:
+            return
+
+        unknown = set()
+        for neighbour in self.neighbours(index):
+            known = self.__known[neighbour]
+            if known == MINE:
+                value -= 1
+            elif known == UNKNOWN:
+                unknown.add(neighbour)
+
+        if unknown:
+            self.__constraints[index] = [unknown, value]
+            self.__dirty.add(index)
+            self.__pair_dirty.add(index)
+
+    def __remove_unknown(self, index, mine):
+        """Removes decided tile from the constraints around it"""
+
+        constraints = self.__constraints
+
+        for neighbour in self.neighbours(index):
+            constraint = constraints.get(neighbour)
+
+            if constraint is not None and index in constraint[0]:
+                constraint[0].discard(index)
+                if mine:
+                    constraint[1] -= 1
+
+                if constraint[0]:
+                    self.__dirty.add(neighbour)
+                    self.__pair_dirty.add(neighbour)
+                else:
+                    del constraints[neighbour]
+                    self.__dirty.discard(neighbour)
+                    self.__pair_dirty.discard(neighbour)
+
+    def __mark(self, index, mine):
+        """Stores a deduction about a hidden tile"""
+
+        if self.__known[index] != UNKNOWN:
+            return
+
+        if mine:
+            self.__known[index] = MINE
+            self.__mines += 1
+        else:
+            self.__known[index] = SAFE
+            self.__safe.add(index)
+
+        self.__remove_unknown(index, mine)
+
+    def __single_rules(self):
+        """Checks the changed constraints one at a time"""
+
+        constraints = self.__constraints
+
+        while self.__dirty:
+            index = self.__dirty.pop()
+            constraint = constraints.get(index)
+
+            if constraint is None:
+                continue
+
+            unknown, mines = constraint
+            if mines == 0:
+                for tile in list(unknown):
+                    self.__mark(tile, False)
+            elif mines == len(unknown):
+                for tile in list(unknown):
+                    self.__mark(tile, True)
+
+    def __pair_rules(self):
+        """Compares the changed constraints with the overlapping ones.
+           If A's unknown tiles are a subset of B's, the tiles in B - A
+           hold the difference of their mines. For any overlap, if A has
+           as many mines more than B as it has tiles outside B, those
+           are mines and B's tiles outside A are safe."""
+
+        constraints = self.__constraints
+
+        while self.__pair_dirty and not self.__dirty:
+            index = self.__pair_dirty.pop()
+            if index not in constraints:
+                continue
+
+            others = set()
+            for tile in constraints[index][0]:
+                for neighbour in self.neighbours(tile):
+                    if neighbour != index and neighbour in constraints:
+                        others.add(neighbour)
+
+            for other in others:
+                a = constraints.get(index)
+                b = constraints.get(other)
+                if a is None or b is None:
+                    break
+
+                self.__compare(a, b)
+                if self.__dirty:
+                    break
+                self.__compare(b, a)
+                if self.__dirty:
+                    break
+
+    def __compare(self, a, b):
+        """Applies the pair rules where a has more mines than b"""
+
+        only_a = a[0] - b[0]
+        only_b = b[0] - a[0]
+        difference = a[1] - b[1]
+
+        if only_a and difference == len(only_a):
+            for tile in only_a:
+                self.__mark(tile, True)
+            for tile in only_b:
+                self.__mark(tile, False)
+
+        elif not only_b and only_a and difference == 0:
+            for tile in only_a:
+                self.__mark(tile, False)
+
+    def __global_rule(self):
+        """Uses the total mine count when everything else is decided.
+
+           :return: True if something was deduced"""
+
+        unknown = self.unknown_count()
+        mines = self.mines_left()
+
+        if unknown == 0 or (mines != 0 and mines != unknown):
+            return False
+
+        for index in range(len(self.__known)):
+            if self.__known[index] == UNKNOWN:
+                y, x = divmod(index, self.__x)
+                if not self.__board.is_opened(y, x):
+                    self.__mark(index, mines != 0)
+
+        return True
+
+    def __enumerate(self):
+        """Enumerates the frontier components and marks the tiles that
+           have the same value in every valid configuration.
+
+           :return: True if something was deduced"""
+
+        mines_left = self.mines_left()
+        unknown = self.unknown_count()
+        found = False
+
+        for tiles, group, results in self.__enumerate_components():
+            if not results:
+                continue
+
+            # Configurations are only possible if the rest of the
+            # board can hold the remaining mines.
+            outside = unknown - len(tiles)
+            feasible = [k for k in results
+                        if k <= mines_left and mines_left - k <= outside]
+            if not feasible:
+                continue
+
+            total = sum(results[k][0] for k in feasible)
+            for p, tile in enumerate(tiles):
+                mine_count = sum(results[k][1][p] for k in feasible)
+                if mine_count == 0:
+                    self.__mark(tile, False)
+                    found = True
+                elif mine_count == total:
+                    self.__mark(tile, True)
+                    found = True
+
+        return found
+
+
+def play(board, rng=None):
+    """
+    Plays the board to the end. Safe tiles are pressed whenever the
+    solver finds them, otherwise a random unknown tile is guessed.
+
+    :param rng: random.Random instance for the guesses.
+    :return: number of presses made"""
+
+    if rng is None:
+        rng = random
+
+    height = board.get_height()
+    width = board.get_width()
+
+    solver = Solver(board)
+    clicks = 0
+
+    while board.status() == "playing":
+        tile = solver.hint()
+
+        if tile is None:
+            hidden = [(i // width, i % width)
+                      for i in range(height * width)
+                      if not board.is_opened(i // width, i % width)
+                      and not solver.is_mine(i // width, i % width)]
+            tile = rng.choice(hidden)
+
+        solver.update(board.reveal(tile[0], tile[1]))
+        clicks += 1
+
+    return clicks
+
+
+def solves_without_guessing(board, y, x):
+    """
+    Plays the board from the first press in y,x using only the tiles
+    the solver knows to be safe.
+
+    :return: True if the board was won without a single guess"""
+
+    solver = Solver(board)
+    solver.update(board.reveal(y, x))
+
+    while board.status() == "playing":
+        tile = solver.hint()
+        if tile is None:
+            return False
+
+        solver.update(board.reveal(tile[0], tile[1]))
+
+    return board.status() == "won"
+
+
+def find_no_guess_board(height, width, mines, rng=None, attempts=1000,
+                        stop=None):
+    """
+    Looks for a board that can be solved without guessing by trying
+    random seeds and first presses.
+
+    :param rng: random.Random instance picking the seeds.
+    :param attempts: number of boards to try before giving up.
+    :param stop: threading.Event, the search gives up once it's set.
+    :return: (seed, y, x) where y,x is the first press to make,
+             None if no board was found"""
+
+    if rng is None:
+        rng = random
+
+    for i in range(attempts):
+        if stop is not None and stop.is_set():
+            return None
+
+        seed = rng.randrange(2 ** 32)
+        y = rng.randrange(height)
+        x = rng.randrange(width)
+
+        if solves_without_guessing(Board(height, width, mines, seed=seed),
+                                   y, x):
+            return seed, y, x
+
+    return None
@@ -0,0 +1,297 @@
+"""
+Statistics of the played games.
+
+Every finished game is stored as a row in a local SQLite database. The
+rows are written by a background thread in batches so ending a game
+never waits for the disk. The statistics window only runs aggregate
+queries which are answered from the indexes:
+
+    games_mode_time  (mode, won, duration_ms)  best times per mode
+    games_mode_id    (mode, id)                latest games per mode
+    games_size_time  (mode, height, width, mines, won, duration_ms)
+    games_size_id    (mode, height, width, mines, id)
+
+The last two answer the same queries per board size. The custom mode
+has no fixed size, so its games are only compared with the games of
+the same size.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+
+# Version of the database schema kept in PRAGMA user_version
+SCHEMA_VERSION = 3
+
+# Games written in one transaction at most
+BATCH_SIZE = 100
+
+# Seconds the writer waits for more games before committing
+BATCH_DELAY = 0.5
+
+# Statements that bring the database from the previous version to
+# the version of the key. Old databases are upgraded in order.
+MIGRATIONS = {
+    1: ["""CREATE TABLE IF NOT EXISTS games (
+               id INTEGER PRIMARY KEY,
+               played_at REAL NOT NULL,
+               mode TEXT NOT NULL,
+               height INTEGER NOT NULL,
+               width INTEGER NOT NULL,
+               mines INTEGER NOT NULL,
+               seed INTEGER,
+               duration_ms INTEGER NOT NULL,
+               clicks INTEGER NOT NULL,
+               three_bv INTEGER,
+               won INTEGER NOT NULL)""",
+        """CREATE INDEX IF NOT EXISTS games_mode_time
+               ON games (mode, won, duration_ms)""",
+        """CREATE INDEX IF NOT EXISTS games_mode_id
+               ON games (mode, id)"""],
+
+    # Board metrics besides the 3BV
+    2: ["ALTER TABLE games ADD COLUMN openings INTEGER",
+        "ALTER TABLE games ADD COLUMN isolated INTEGER"],
+
+    # Queries of a single board size
+    3: ["""CREATE INDEX IF NOT EXISTS games_size_time
+               ON games (mode, height, width, mines, won, duration_ms)""",
+        """CREATE INDEX IF NOT EXISTS games_size_id
+               ON games (mode, height, width, mines, id)"""]}
+
+# Queued to make the writer commit without waiting for more games
+FLUSH = "flush"
+
+COLUMNS = ("played_at", "mode", "height", "width", "mines", "seed",
+           "duration_ms", "clicks", "three_bv", "openings", "isolated",
+           "won")
+
+
+class StatsStore:
+    """Statistics database. Games are queued with record() and written
+       by a background thread, the queries run on the calling thread
+       with their own connection."""
+
+    def __init__(self, path):
+        self.__path = path
+
+        # Games waiting to be written, None tells the writer to stop.
+        self.__queue = queue.Queue()
+        self.__writer = None
+        self.__lock = threading.Lock()
+
+        # Connection of the thread running the queries
+        self.__reader = None
+
+    def record(self, mode, height, width, mines, seed, duration, clicks,
+               metrics, won):
+        """
+        Queues a finished game to be written.
+
+        :param duration: game time in milliseconds
+        :param clicks: number of actions made in the game
+        :param metrics: dict of the board metrics from
+                        Board.get_metrics() or None
+        :param won: True if the game was won"""
+
+        if metrics is None:
+            metrics = {}
+
+        self.__queue.put((time.time(), mode, height, width, mines, seed,
+                          duration, clicks, metrics.get("three_bv"),
+                          metrics.get("openings"), metrics.get("isolated"),
+                          1 if won else 0))
+
+        with self.__lock:
+            if self.__writer is None:
+                self.__writer = threading.Thread(target=self.__write_loop,
+                                                 name="stats-writer",
+                                                 daemon=True)
+                self.__writer.start()
+
+    def flush(self):
+        """Waits until every queued game has been written"""
+
+        with self.__lock:
+            if self.__writer is None:
+                return
+            self.__queue.put(FLUSH)
+
+        self.__queue.join()
+
+    def close(self):
+        """Writes the queued games and stops the writer"""
+
+        with self.__lock:
+            writer = self.__writer
+            self.__writer = None
+
+        if writer is not None:
+            self.__queue.put(None)
+            writer.join()
+
+        if self.__reader is not None:
+            self.__reader.close()
+            self.__reader = None
+
+    def summary(self, mode, size=None):
+        """
+        Returns the totals of the mode.
+
+        :param size: (height, width, mines) to count only the games of
+                     that board size, None for every size
+        :return: dict with games, wins, win_rate and the mean duration
+                 and 3BV of the won games"""
+
+        where, parameters = self.__where(mode, size)
+
+        games, wins = self.__query(
+            "SELECT COUNT(*), COALESCE(SUM(won), 0) FROM games "
+            "WHERE " + where, parameters)[0]
+
+        mean_time, mean_three_bv = self.__query(
+            "SELECT AVG(duration_ms), AVG(three_bv) FROM games "
+            "WHERE " + where + " AND won = 1", parameters)[0]
+
+        return {"games": games,
+                "wins": wins,
+                "win_rate": wins / games if games else 0.0,
+                "mean_time": mean_time,
+                "mean_three_bv": mean_three_bv}
+
+    def best_times(self, mode, limit=10, size=None):
+        """
+        Returns the fastest won games of the mode.
+
+        :param size: (height, width, mines) of the board, see summary
+        :return: list of (duration_ms, three_bv, clicks, played_at,
+                 seed)"""
+
+        where, parameters = self.__where(mode, size)
+
+        return self.__query(
+            "SELECT duration_ms, three_bv, clicks, played_at, seed "
+            "FROM games WHERE " + where + " AND won = 1 "
+            "ORDER BY duration_ms LIMIT ?", parameters + (limit,))
+
+    def rolling_win_rate(self, mode, last=100, size=None):
+        """
+        Returns the win rate of the latest games of the mode.
+
+        :param size: (height, width, mines) of the board, see summary
+        :return: (games, wins) of the at most last games"""
+
+        where, parameters = self.__where(mode, size)
+
+        games, wins = self.__query(
+            "SELECT COUNT(*), COALESCE(SUM(won), 0) FROM "
+            "(SELECT won FROM games WHERE " + where + " "
+            "ORDER BY id DESC LIMIT ?)", parameters + (last,))[0]
+
+        return games, wins
+
+    def __where(self, mode, size):
+        """Returns the condition picking the games of the mode and
+           the board size, and its parameters"""
+
+        if size is None:
+            return "mode = ?", (mode,)
+
+        return "mode = ? AND height = ? AND width = ? AND mines = ?", \
+            (mode,) + tuple(size)
+
+    def __query(self, sql, parameters):
+        """Runs a read query and returns all the rows"""
+
+        if self.__reader is None:
+            self.__reader = self.__connect()
+
+        return self.__reader.execute(sql, parameters).fetchall()
+
+    def __connect(self):
+        """Opens the database, creating or upgrading the tables when
+           needed"""
+
+        connection = sqlite3.connect(self.__path, timeout=10)
+
+        # Readers don't block the writer and the other way around.
+        connection.execute("PRAGMA journal_mode = WAL")
+
+        if self.__version(connection) < SCHEMA_VERSION:
+            self.__migrate(connection)
+
+        return connection
+
+    def __version(self, connection):
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def __migrate(self, connection):
+        """Runs the missing migrations in one transaction. The version
+           is read again inside it since the other connection might
+           have upgraded the database in between."""
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.__version(connection)
+            if version > SCHEMA_VERSION:
+                raise sqlite3.DatabaseError(
+                    "statistics are from a newer version")
+
+            for step in range(version + 1, SCHEMA_VERSION + 1):
+                for statement in MIGRATIONS[step]:
+                    connection.execute(statement)
+
+            connection.execute("PRAGMA user_version = {:d}"
+                               .format(SCHEMA_VERSION))
+            connection.commit()
+
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def __write_loop(self):
+        """Writes the queued games in batches until told to stop"""
+
+        try:
+            connection = self.__connect()
+        except sqlite3.Error:
+            # The games are still taken off the queue so nobody waits
+            # for them forever.
+            connection = None
+
+        insert = "INSERT INTO games ({:s}) VALUES ({:s})".format(
+            ", ".join(COLUMNS), ", ".join("?" * len(COLUMNS)))
+
+        running = True
+        while running:
+            batch = [self.__queue.get()]
+
+            # Games ending close together go into the same transaction.
+            deadline = time.monotonic() + BATCH_DELAY
+            while len(batch) < BATCH_SIZE \
+                    and batch[-1] is not None and batch[-1] is not FLUSH:
+                try:
+                    batch.append(self.__queue.get(
+                        timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                running = False
+
+            rows = [row for row in batch
+                    if row is not None and row is not FLUSH]
+            try:
+                if rows and connection is not None:
+                    with connection:
+                        connection.executemany(insert, rows)
+            except sqlite3.Error:
+                # Statistics are not worth stopping the game for.
+                pass
+            finally:
+                for i in batch:
+                    self.__queue.task_done()
+
+        if connection is not None:
+            connection.close()
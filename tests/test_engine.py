@@ -0,0 +1,142 @@
+"""Tests of the headless board engine"""
+
+import random
+import unittest
+
+import engine
+from engine import Board, generate_board
+
+
+class GenerateBoardTest(unittest.TestCase):
+
+    @unittest.skipIf(engine._load_numpy() is None, "NumPy isn't installed")
+    def test_numpy_and_python_give_the_same_board(self):
+        rng = random.Random(3)
+
+        # Sizes below and above NUMPY_LIMIT
+        for height, width in [(9, 9), (16, 30), (50, 50), (40, 120)]:
+            for i in range(20):
+                mines = rng.randrange(height * width // 3)
+                seed = rng.random()
+                safe = (rng.randrange(height), rng.randrange(width))
+
+                self.assertEqual(
+                    generate_board(height, width, mines,
+                                   random.Random(seed), safe),
+                    generate_board(height, width, mines,
+                                   random.Random(seed), safe,
+                                   use_numpy=False))
+
+    def test_numbers_count_the_mines_around(self):
+        rng = random.Random(5)
+
+        for i in range(50):
+            height, width = rng.randint(1, 30), rng.randint(1, 30)
+            board = Board(height, width, rng.randint(0, height * width // 4),
+                          seed=rng.randrange(2 ** 32))
+            board.generate(rng.randrange(height), rng.randrange(width))
+            data = board.get_data()
+
+            for y in range(height):
+                for x in range(width):
+                    if data[y][x] == "x":
+                        continue
+
+                    mines = sum(data[i][j] == "x"
+                                for i in range(max(y - 1, 0),
+                                               min(y + 2, height))
+                                for j in range(max(x - 1, 0),
+                                               min(x + 2, width)))
+                    self.assertEqual(data[y][x], mines)
+
+    def test_seed_gives_the_same_layout(self):
+        first = Board(16, 30, 99, seed=5)
+        first.reveal(8, 15)
+        second = Board(16, 30, 99, seed=5)
+        second.reveal(8, 15)
+
+        self.assertEqual(first.get_mines(), second.get_mines())
+
+
+class ChordTest(unittest.TestCase):
+
+    def number_to_chord(self, board):
+        """Returns a revealed number with hidden safe tiles around it,
+           its hidden mines and its hidden safe tiles"""
+
+        height, width = board.get_height(), board.get_width()
+
+        for y in range(height):
+            for x in range(width):
+                if not board.is_opened(y, x) or board.get_value(y, x) == 0:
+                    continue
+
+                hidden = [(i, j) for i in range(max(y - 1, 0),
+                                                min(y + 2, height))
+                          for j in range(max(x - 1, 0), min(x + 2, width))
+                          if not board.is_opened(i, j)]
+                mines = [tile for tile in hidden
+                         if board.get_value(tile[0], tile[1]) == "x"]
+                safe = [tile for tile in hidden if tile not in mines]
+                if safe:
+                    return (y, x), mines, safe
+
+        self.fail("No number to chord")
+
+    def test_chord_opens_the_neighbours(self):
+        for seed in range(10):
+            board = Board(16, 16, 40, seed=seed)
+            board.reveal(8, 8)
+            (y, x), mines, safe = self.number_to_chord(board)
+
+            for tile in mines:
+                board.toggle_flag(tile[0], tile[1])
+
+            changes = board.chord_changes(y, x)
+            self.assertEqual(changes.get_status(), board.status())
+            self.assertNotEqual(board.status(), "lost")
+            for tile in safe:
+                self.assertTrue(board.is_opened(tile[0], tile[1]))
+                self.assertIn(tile, changes.get_opened())
+            for tile in mines:
+                self.assertTrue(board.is_flagged(tile[0], tile[1]))
+
+    def test_wrong_flag_loses(self):
+        for seed in range(10):
+            board = Board(16, 16, 40, seed=seed)
+            board.reveal(8, 8)
+            (y, x), mines, safe = self.number_to_chord(board)
+
+            # The flag count matches but one flag is on a safe tile.
+            flags = mines[1:] + safe[:1]
+            if len(flags) != len(mines):
+                continue
+            for tile in flags:
+                board.toggle_flag(tile[0], tile[1])
+
+            self.assertEqual(board.chord_changes(y, x).get_status(),
+                             "lost")
+            self.assertEqual(board.status(), "lost")
+
+    def test_chord_without_matching_flags_does_nothing(self):
+        board = Board(16, 16, 40, seed=1)
+        board.reveal(8, 8)
+        (y, x), mines, safe = self.number_to_chord(board)
+        opened = board.opened_count()
+
+        hidden = [(i, j) for i in range(16) for j in range(16)
+                  if not board.is_opened(i, j)]
+        blank = [(i, j) for i in range(16) for j in range(16)
+                 if board.is_opened(i, j) and board.get_value(i, j) == 0]
+
+        # Too few flags, a hidden tile and a blank tile
+        for tile in [(y, x), hidden[0]] + blank[:1]:
+            changes = board.chord_changes(tile[0], tile[1])
+            self.assertEqual(changes.get_opened(), [])
+            self.assertEqual(changes.get_status(), "playing")
+
+        self.assertEqual(board.opened_count(), opened)
+
+
+if __name__ == "__main__":
+    unittest.main()
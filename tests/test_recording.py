@@ -0,0 +1,122 @@
+"""Tests of the game recordings"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import recording
+from engine import Board
+from solver import Solver
+
+
+def play(height, width, mines, seed, start=None):
+    """Plays a game with the solver and a few flags, recording every
+       action. Returns the recording and the final board."""
+
+    rng = random.Random(seed)
+    board = Board(height, width, mines, seed=seed)
+    if start is not None:
+        board.generate(start[0], start[1])
+    game = recording.Recording(height, width, mines, seed, "test", start)
+
+    y, x = start if start is not None else (height // 2, width // 2)
+    elapsed = 0
+    solver = Solver(board)
+
+    while board.status() == "playing":
+        elapsed += rng.randrange(2000)
+
+        # Flags something now and then to have every action in it.
+        if rng.random() < 0.1:
+            flag = rng.randrange(height), rng.randrange(width)
+            if board.toggle_flag(flag[0], flag[1]):
+                game.add(recording.FLAG, flag[0], flag[1], elapsed)
+            continue
+
+        if board.is_flagged(y, x):
+            board.toggle_flag(y, x)
+            game.add(recording.FLAG, y, x, elapsed)
+
+        game.add(recording.REVEAL, y, x, elapsed)
+        solver.update(board.reveal(y, x))
+
+        tile = solver.hint()
+        if tile is None:
+            hidden = [(i, j) for i in range(height) for j in range(width)
+                      if not board.is_opened(i, j)]
+            tile = rng.choice(hidden)
+        y, x = tile
+
+    return game, board
+
+
+class RecordingTest(unittest.TestCase):
+
+    def test_bytes_round_trip(self):
+        for seed in range(20):
+            game, board = play(16, 16, 40, seed)
+            copy = recording.from_bytes(game.to_bytes())
+
+            self.assertEqual(copy.get_seed(), game.get_seed())
+            self.assertEqual(copy.get_mode(), "test")
+            self.assertEqual(copy.get_start(), None)
+            self.assertEqual(copy.get_duration(), game.get_duration())
+            self.assertEqual([copy.get_event(i)
+                              for i in range(copy.get_event_count())],
+                             [game.get_event(i)
+                              for i in range(game.get_event_count())])
+
+    def test_replay_rebuilds_the_game(self):
+        for seed in range(20):
+            start = (seed % 9, seed % 7) if seed % 2 else None
+            game, board = play(9, 9, 10, seed, start)
+
+            replayed = recording.replay(
+                recording.from_bytes(game.to_bytes()))
+
+            self.assertEqual(replayed.status(), board.status())
+            self.assertEqual(recording.format_board(replayed),
+                             recording.format_board(board))
+
+    def test_seek_back_and_forth(self):
+        game, board = play(16, 30, 99, 7)
+        replay = recording.Replay(game)
+
+        end = recording.format_board(replay.seek(game.get_event_count()))
+        middle = recording.format_board(replay.seek(3))
+        self.assertEqual(recording.format_board(replay.seek(3)), middle)
+        self.assertEqual(recording.format_board(replay.seek(10 ** 6)), end)
+
+    def test_invalid_data_is_rejected(self):
+        data = play(9, 9, 10, 1)[0].to_bytes()
+
+        for broken in (b"", b"XXXX" + data[4:], data[:len(data) // 2]):
+            with self.assertRaises(ValueError):
+                recording.from_bytes(broken)
+
+    def test_writer_saves_in_the_background(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "last_game.rec")
+
+        writer = recording.Writer()
+        games = [play(9, 9, 10, seed)[0] for seed in range(3)]
+        for game in games:
+            writer.save(game, path)
+
+        # A path that can't be written doesn't stop the writer.
+        writer.save(games[0], os.path.join(directory, "missing", "x.rec"))
+        writer.flush()
+        self.assertEqual(recording.load(path).to_bytes(),
+                         games[-1].to_bytes())
+
+        writer.save(games[0], path)
+        writer.close()
+        self.assertEqual(recording.load(path).to_bytes(),
+                         games[0].to_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
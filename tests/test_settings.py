@@ -0,0 +1,118 @@
+"""Tests of the settings file and its cache"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import Minesweeper
+from Minesweeper import GameData, SettingsCache
+
+
+class SettingsTest(unittest.TestCase):
+
+    def setUp(self):
+        # The settings files are looked up from the working directory.
+        self.previous = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+        # Reading errors would open a popup.
+        patcher = mock.patch.object(Minesweeper, "file_error",
+                                    side_effect=AssertionError("popup"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.settings = GameData().get_default()
+        self.settings["mode"] = "advanced"
+
+    def tearDown(self):
+        os.chdir(self.previous)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def read_file(self):
+        with open(Minesweeper.SETTINGS_FILE, "r") as file:
+            return json.load(file)
+
+    def test_json_round_trip(self):
+        cache = SettingsCache(Minesweeper.SETTINGS_FILE)
+        cache.store(self.settings)
+        cache.store_section("custom", {"height": 20, "width": 30,
+                                       "mines": 100})
+        cache.flush()
+
+        document = self.read_file()
+        self.assertEqual(document["settings"], self.settings)
+        self.assertEqual(document["custom"]["mines"], 100)
+
+        copy = SettingsCache(Minesweeper.SETTINGS_FILE)
+        self.assertEqual(copy.get_all(), self.settings)
+        self.assertEqual(copy.get_section("custom"), document["custom"])
+
+    def test_settings_txt_is_migrated(self):
+        with open(Minesweeper.LEGACY_SETTINGS_FILE, "w") as file:
+            for key, value in self.settings.items():
+                if key != "no guessing":
+                    file.write("{:s}={:s}\n".format(key, value))
+
+        cache = SettingsCache(Minesweeper.SETTINGS_FILE)
+        self.assertEqual(cache.get("mode"), "advanced")
+
+        # The settings missing from the old file get their defaults.
+        self.assertEqual(self.read_file()["settings"], self.settings)
+
+    def test_saving_without_a_file(self):
+        cache = SettingsCache(Minesweeper.SETTINGS_FILE)
+        cache.store_section("custom", {"height": 5, "width": 5,
+                                       "mines": 3})
+        cache.flush()
+
+        self.assertEqual(self.read_file()["settings"],
+                         GameData().get_default())
+
+    def test_changes_are_written_once(self):
+        cache = SettingsCache(Minesweeper.SETTINGS_FILE)
+        cache.store(GameData().get_default())
+        cache.flush()
+
+        with mock.patch.object(Minesweeper, "SAVE_DELAY", 0.05), \
+                mock.patch.object(Minesweeper, "write_json",
+                                  wraps=Minesweeper.write_json) as write:
+            for mode in ("normal", "custom", "advanced"):
+                settings = dict(self.settings, mode=mode)
+                cache.store(settings)
+
+                # Waiting changes are read from the cache.
+                self.assertEqual(cache.get("mode"), mode)
+
+            for i in range(100):
+                if write.called:
+                    break
+                time.sleep(0.05)
+            time.sleep(0.1)
+
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(self.read_file()["settings"], self.settings)
+
+    def test_file_is_read_again_when_changed(self):
+        cache = SettingsCache(Minesweeper.SETTINGS_FILE)
+        cache.store(GameData().get_default())
+        cache.flush()
+        self.assertEqual(cache.get("mode"), "beginner")
+
+        Minesweeper.write_json(Minesweeper.SETTINGS_FILE,
+                               {"settings": self.settings})
+
+        # Makes sure the modification time differs on coarse clocks.
+        stat = os.stat(Minesweeper.SETTINGS_FILE)
+        os.utime(Minesweeper.SETTINGS_FILE,
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        self.assertEqual(cache.get("mode"), "advanced")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+"""Tests of the solver"""
+
+import itertools
+import random
+import unittest
+
+from engine import Board
+from solver import Solver
+
+
+def brute_force(board):
+    """Returns the mine probability of every hidden tile by going
+       through every mine layout that fits the revealed numbers"""
+
+    height, width = board.get_height(), board.get_width()
+    hidden = [(y, x) for y in range(height) for x in range(width)
+              if not board.is_opened(y, x)]
+    opened = [(y, x) for y in range(height) for x in range(width)
+              if board.is_opened(y, x)]
+
+    counts = dict.fromkeys(hidden, 0)
+    layouts = 0
+    for mines in itertools.combinations(hidden, board.get_mines_count()):
+        mines = set(mines)
+        if all(board.get_value(y, x)
+               == sum((i, j) in mines for i in range(y - 1, y + 2)
+                      for j in range(x - 1, x + 2))
+               for y, x in opened):
+            layouts += 1
+            for tile in mines:
+                counts[tile] += 1
+
+    return {tile: count / layouts for tile, count in counts.items()}
+
+
+def count_component(board, tiles):
+    """Counts the mine configurations of the frontier tiles by going
+       through them one by one, in the format of
+       Solver.enumerate_component. Only usable on a fresh solver
+       that hasn't deduced anything yet."""
+
+    width = board.get_width()
+    position = {tile: p for p, tile in enumerate(tiles)}
+
+    # Revealed numbers around the tiles: [value, tile positions]
+    numbers = {}
+    for tile in tiles:
+        y, x = divmod(tile, width)
+        for i in range(max(y - 1, 0), min(y + 2, board.get_height())):
+            for j in range(max(x - 1, 0), min(x + 2, width)):
+                if board.is_opened(i, j):
+                    numbers.setdefault(i * width + j,
+                                       [board.get_value(i, j), []])
+    for index, number in numbers.items():
+        y, x = divmod(index, width)
+        number[1] = [position[i * width + j]
+                     for i in range(y - 1, y + 2)
+                     for j in range(max(x - 1, 0), min(x + 2, width))
+                     if i * width + j in position]
+
+    touching = [[n for n in numbers.values() if p in n[1]]
+                for p in range(len(tiles))]
+    values = [0] * len(tiles)
+    results = {}
+
+    def assign(p):
+        if p == len(tiles):
+            mines = sum(values)
+            result = results.setdefault(mines, [0, [0] * len(tiles)])
+            result[0] += 1
+            for i, value in enumerate(values):
+                result[1][i] += value
+            return
+
+        for value in (0, 1):
+            values[p] = value
+            if all(sum(values[i] for i in n[1] if i <= p) <= n[0]
+                   <= sum(values[i] for i in n[1] if i <= p)
+                   + sum(1 for i in n[1] if i > p)
+                   for n in touching[p]):
+                assign(p + 1)
+        values[p] = 0
+
+    assign(0)
+    return results
+
+
+class ProbabilitiesTest(unittest.TestCase):
+
+    def test_probabilities_match_brute_force(self):
+        rng = random.Random(3)
+        checked = 0
+
+        while checked < 100:
+            height, width = rng.randrange(3, 6), rng.randrange(3, 6)
+            mines = rng.randrange(1, height * width // 3 + 2)
+            if mines >= height * width - 1:
+                continue
+
+            board = Board(height, width, mines, seed=rng.randrange(10 ** 6))
+            solver = Solver(board)
+            solver.update(board.reveal(rng.randrange(height),
+                                       rng.randrange(width)))
+
+            # A few safe presses give positions further in the game.
+            for i in range(rng.randrange(4)):
+                tile = solver.hint()
+                if tile is None or board.status() != "playing":
+                    break
+                solver.update(board.reveal(tile[0], tile[1]))
+
+            if board.status() != "playing":
+                continue
+
+            probabilities = solver.probabilities()
+            for tile, expected in brute_force(board).items():
+                self.assertAlmostEqual(probabilities[tile], expected,
+                                       places=9)
+            checked += 1
+
+    def test_long_frontier_is_enumerated(self):
+        # The first press opens a frontier of over 40 tiles on these
+        # advanced boards. On seed 51 it has a single configuration.
+        for seed in (51, 56):
+            board = Board(16, 30, 99, seed=seed)
+            solver = Solver(board)
+            solver.update(board.reveal(8, 15))
+
+            tiles, group = max(solver.frontier_components(),
+                               key=lambda component: len(component[0]))
+            self.assertGreater(len(tiles), 40)
+            self.assertEqual(solver.enumerate_component(tiles, group),
+                             count_component(board, tiles))
+
+            if seed == 51:
+                probabilities = solver.probabilities()
+                for tile in tiles:
+                    y, x = divmod(tile, board.get_width())
+                    self.assertEqual(probabilities[y, x],
+                                     board.get_value(y, x) == "x")
+                self.assertIsNotNone(solver.hint())
+
+    def test_hint_is_never_a_mine(self):
+        for seed in range(30):
+            board = Board(16, 16, 40, seed=seed)
+            solver = Solver(board)
+            solver.update(board.reveal(8, 8))
+
+            tile = solver.hint()
+            while tile is not None and board.status() == "playing":
+                self.assertNotEqual(board.get_value(tile[0], tile[1]), "x")
+                solver.update(board.reveal(tile[0], tile[1]))
+                tile = solver.hint()
+
+
+if __name__ == "__main__":
+    unittest.main()
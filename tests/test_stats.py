@@ -0,0 +1,66 @@
+"""Tests of the game statistics"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import stats
+
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "stats.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_custom_sizes_are_kept_apart(self):
+        store = stats.StatsStore(self.path)
+        store.record("custom", 2, 2, 1, 1, 10, 1, None, True)
+        store.record("custom", 100, 100, 2000, 2, 90000, 900, None, True)
+        store.record("custom", 100, 100, 2000, 3, 50000, 900, None, False)
+        store.flush()
+
+        size = (100, 100, 2000)
+        self.assertEqual([row[0] for row in store.best_times("custom",
+                                                             size=size)],
+                         [90000])
+        self.assertEqual(store.summary("custom", size)["games"], 2)
+        self.assertEqual(store.rolling_win_rate("custom", 10, size), (2, 1))
+        self.assertEqual(store.rolling_win_rate("custom", 10, (2, 2, 1)),
+                         (1, 1))
+
+        # Without a size every game of the mode is counted.
+        self.assertEqual(store.summary("custom")["games"], 3)
+        store.close()
+
+    def test_old_database_is_upgraded(self):
+        connection = sqlite3.connect(self.path)
+        for version in (1, 2):
+            for statement in stats.MIGRATIONS[version]:
+                connection.execute(statement)
+        connection.execute("PRAGMA user_version = 2")
+        connection.commit()
+        connection.close()
+
+        store = stats.StatsStore(self.path)
+        self.assertEqual(store.summary("custom", (9, 9, 10))["games"], 0)
+        store.close()
+
+        connection = sqlite3.connect(self.path)
+        indexes = {row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        connection.close()
+
+        self.assertEqual(version, stats.SCHEMA_VERSION)
+        self.assertIn("games_size_time", indexes)
+        self.assertIn("games_size_id", indexes)
+
+
+if __name__ == "__main__":
+    unittest.main()